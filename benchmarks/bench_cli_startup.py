@@ -0,0 +1,101 @@
+"""CLI startup: import time and time until the main menu is on screen.
+
+Runs in a throwaway HOME holding a cached session (an unsigned token with a
+future exp claim), so nothing touches ~/.cache/taskline. By default the
+server is a local socket that accepts connections and never answers, like a
+Render instance that is still waking up; the menu must not wait for it.
+
+    python benchmarks/bench_cli_startup.py [--runs 10] [--url https://...]
+"""
+import argparse
+import base64
+import json
+import os
+import pty
+import select
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MENU_MARKER = b"Task Line CLI"
+
+def fake_session(home: str):
+    claims = base64.urlsafe_b64encode(json.dumps({"user_name": "bench", "exp": int(time.time()) + 3600}).encode())
+    token = "e30." + claims.decode().rstrip("=") + ".sig"
+    cache = os.path.join(home, ".cache", "taskline")
+    os.makedirs(cache, exist_ok=True)
+    with open(os.path.join(cache, "session"), "w") as f:
+        json.dump({"token": token, "user": {"name": "bench", "id": 1}}, f)
+
+def silent_server() -> str:
+    """URL of a server that accepts connections and never responds."""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(64)
+    held = []
+    def accept():
+        while True:
+            conn, _ = server.accept()
+            held.append(conn)
+    threading.Thread(target=accept, daemon=True).start()
+    return f"http://127.0.0.1:{server.getsockname()[1]}"
+
+def import_ms(env) -> float:
+    code = "import time; t = time.perf_counter(); import cli; print((time.perf_counter() - t) * 1000)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+def first_frame_ms(env, timeout: float) -> float | None:
+    start = time.perf_counter()
+    pid, fd = pty.fork()
+    if pid == 0:
+        os.chdir(ROOT)
+        os.execve(sys.executable, [sys.executable, "cli.py"], {**env, "TERM": "xterm", "LINES": "30", "COLUMNS": "100"})
+    seen, elapsed = b"", None
+    try:
+        while time.perf_counter() - start < timeout:
+            ready, _, _ = select.select([fd], [], [], 0.05)
+            if ready:
+                try:
+                    seen += os.read(fd, 65536)
+                except OSError:
+                    break
+                if MENU_MARKER in seen:
+                    elapsed = (time.perf_counter() - start) * 1000
+                    break
+        if elapsed is not None:
+            os.write(fd, b"q")
+            time.sleep(0.2)
+    finally:
+        try:
+            os.kill(pid, 9)
+        except ProcessLookupError:
+            pass
+        os.waitpid(pid, 0)
+        os.close(fd)
+    return elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--url", help="server to point the CLI at (default: one that never answers)")
+    parser.add_argument("--timeout", type=float, default=20.0, help="seconds to wait for the menu")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        fake_session(home)
+        env = {**os.environ, "HOME": home, "TASKLINE_URL": args.url or silent_server()}
+        imports = [import_ms(env) for _ in range(args.runs)]
+        frames = [first_frame_ms(env, args.timeout) for _ in range(args.runs)]
+
+    print(f"import cli      median {statistics.median(imports):7.1f} ms  max {max(imports):7.1f} ms")
+    shown = [ms for ms in frames if ms is not None]
+    if shown:
+        print(f"first frame     median {statistics.median(shown):7.1f} ms  max {max(shown):7.1f} ms")
+    if len(shown) < len(frames):
+        print(f"menu not shown within {args.timeout:g}s in {len(frames) - len(shown)} of {len(frames)} runs")
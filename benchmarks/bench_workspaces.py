@@ -0,0 +1,82 @@
+"""Latency of GET /workspaces as the number of workspaces per user grows.
+
+Runs get_workspace against an in-memory SQLite database and reports the
+median latency and the number of SQL statements per call. Each statement
+is charged a simulated network round-trip (--rtt-ms, default 5) so the
+numbers resemble a remote Postgres such as Neon.
+
+    python benchmarks/bench_workspaces.py [--rtt-ms 5]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import statistics
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from paths.user_manager import User, create_access_token, user_cache
+from paths.workspace_manager import Workspace, Members, get_workspace
+
+SIZES = [1, 10, 50, 200]
+MEMBERS_PER_WORKSPACE = 4
+ROUNDS = 50
+
+async def seed(engine, n):
+    async with AsyncSession(engine) as session:
+        session.add(User(name="owner", password="x"))
+        for i in range(MEMBERS_PER_WORKSPACE):
+            session.add(User(name=f"member{i}", password="x"))
+        for w in range(n):
+            ws = Workspace(name=f"ws{w}", owner="owner")
+            session.add(ws)
+            await session.flush()
+            for i in range(MEMBERS_PER_WORKSPACE):
+                session.add(Members(workspace_id=ws.id, member=f"member{i}"))
+        await session.commit()
+
+async def run(n, rtt):
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    await seed(engine, n)
+    user_cache.clear()
+    token = create_access_token({"user_name": "owner"})
+
+    queries = [0]
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count_and_delay(*args):
+        queries[0] += 1
+        if rtt:
+            time.sleep(rtt)
+
+    def call(session):
+        return get_workspace(Request({"type": "http", "headers": []}), Response(), session, token)
+
+    timings = []
+    async with AsyncSession(engine) as session:
+        await call(session)  # warm the user cache
+        queries[0] = 0
+        for _ in range(ROUNDS):
+            start = time.perf_counter()
+            result = await call(session)
+            timings.append(time.perf_counter() - start)
+    await engine.dispose()
+    assert len(result) == n
+    return statistics.median(timings) * 1000, queries[0] / ROUNDS
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rtt-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    print(f"{'workspaces':>10} {'p50 ms':>8} {'queries/call':>13}")
+    for n in SIZES:
+        p50, q = asyncio.run(run(n, args.rtt_ms / 1000))
+        print(f"{n:>10} {p50:>8.2f} {q:>13.1f}")
@@ -0,0 +1,84 @@
+"""Requests/second of a running server at a fixed concurrency.
+
+Registers (or logs in) a throwaway user, seeds a few tasks, then keeps
+--concurrency clients busy for --duration seconds against the task and
+workspace listings. Run it once against a server started from an older
+commit and once against this one to compare. Needs httpx, which the server
+does not (pip install -r benchmarks/requirements.txt).
+
+    uvicorn main:app --workers 1 &
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --concurrency 32 --duration 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+
+USER = "loadtest"
+PASSWORD = "loadtest-password"
+SEED_TASKS = 50
+
+async def login(client):
+    await client.post("/users/register/", json={"name": USER, "password": PASSWORD})
+    r = await client.post("/users/login/", json={"name": USER, "password": PASSWORD})
+    r.raise_for_status()
+    client.headers["Authorization"] = f"Bearer {r.json()['access_token']}"
+    r = await client.get("/users/verify")
+    r.raise_for_status()
+    return r.json()["id"]
+
+async def seed(client, user_id):
+    r = await client.get(f"/personaltasks/{user_id}")
+    body = r.json()
+    # servers from before keyset pagination return a bare list
+    tasks = body if isinstance(body, list) else body.get("tasks", [])
+    if len(tasks) >= SEED_TASKS:
+        return
+    for i in range(SEED_TASKS):
+        await client.post(f"/personaltasks/{user_id}",
+                          json={"name": f"load {i}", "date": "01-01-2026", "user_id": user_id})
+
+async def worker(client, paths, deadline, timings, errors):
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            r = await client.get(path)
+            if r.status_code >= 400:
+                errors.append(r.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        timings.append(time.perf_counter() - start)
+
+async def main(args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+        user_id = await login(client)
+        await seed(client, user_id)
+        paths = [f"/personaltasks/{user_id}", "/workspaces/"]
+        timings, errors = [], []
+        deadline = time.perf_counter() + args.duration
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client, paths, deadline, timings, errors) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    ms = sorted(t * 1000 for t in timings)
+    def pct(p):
+        return ms[min(len(ms) - 1, int(len(ms) * p))] if ms else 0.0
+    print(f"concurrency {args.concurrency}, {elapsed:.1f}s")
+    print(f"requests    {len(ms)} ok, {len(errors)} failed")
+    print(f"throughput  {len(ms) / elapsed:.1f} req/s")
+    if ms:
+        print(f"latency ms  p50 {statistics.median(ms):.1f}  p95 {pct(0.95):.1f}  p99 {pct(0.99):.1f}  max {ms[-1]:.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    asyncio.run(main(parser.parse_args()))
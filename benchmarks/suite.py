@@ -0,0 +1,470 @@
+"""Per-route latency and throughput of the API against a seeded database.
+
+    python benchmarks/suite.py seed [--db benchmarks/bench.db] [--users 2000 ...]
+    python benchmarks/suite.py run --mode inproc            # main.app through ASGITransport
+    python benchmarks/suite.py run --mode http --url http://127.0.0.1:8000
+    python benchmarks/suite.py compare old.json new.json [--threshold 10]
+
+seed builds a SQLite database with deterministic ids (users bench1..benchN,
+their personal tasks, workspaces with members and shared tasks) and records
+its shape next to it in <db>.json. run sends --requests requests per route at
+--concurrency and writes p50/p95/p99 and throughput per route to
+benchmarks/results/<time>-<commit>-<mode>.json. For http mode, start the
+server on the same file first:
+
+    DATABASE_URL=sqlite:///benchmarks/bench.db uvicorn main:app
+
+Tokens are minted locally, so the server must use this checkout's secret key.
+Needs httpx (pip install -r benchmarks/requirements.txt).
+The SSE route is left out: it streams until the client goes away.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = "bench-password"
+PRIORITIES = ["High", "Normal", "Low"]
+STATUSES = ["new", "new", "in progress", "completed"]
+WORDS = ["report", "deploy", "review", "invoice", "backup", "meeting", "design", "refactor", "release", "survey"]
+
+def use_database(path: str):
+    # must run before anything imports database
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(path)}"
+
+def task_row(i: int, rng: random.Random, now: datetime) -> dict:
+    created = now - timedelta(minutes=rng.randrange(60 * 24 * 365))
+    return {
+        "name": f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}",
+        "priority": rng.choice(PRIORITIES),
+        "date": created.strftime("%b %d"),
+        "status": rng.choice(STATUSES),
+        "due_at": created + timedelta(days=rng.randrange(1, 30)) if rng.random() < 0.3 else None,
+        "version": i,
+        "created_at": created,
+        "updated_at": created,
+    }
+
+def member_ids(shape: dict, workspace_id: int) -> list:
+    users, members = shape["users"], shape["members"]
+    owner = (workspace_id - 1) % users
+    return [(owner + (k + 1) * users // (members + 1)) % users + 1 for k in range(members)]
+
+def owner_id(shape: dict, workspace_id: int) -> int:
+    return (workspace_id - 1) % shape["users"] + 1
+
+async def seed(args):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    use_database(args.db)
+    from sqlalchemy import insert
+    import database
+    from hashing import pwd_context
+    from migrations import run_migrations
+    from paths.user_manager import User
+    from paths.task_manager import Task
+    from paths.shared_tasks import SharedTask
+    from paths.workspace_manager import Workspace, Members
+    from paths.versions import CollectionVersion, personal_key, shared_key
+
+    shape = {"users": args.users, "workspaces": args.workspaces, "members": args.members,
+             "personal_tasks": args.personal_tasks, "shared_tasks": args.shared_tasks}
+    if args.members >= args.users:
+        sys.exit("--members must be smaller than --users")
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc)
+    password = pwd_context.hash(PASSWORD)  # one hash for everyone; argon2 per user would take minutes
+    started = time.perf_counter()
+    await database.create_db_and_tables()
+    async with database.engine.begin() as conn:
+        await conn.execute(insert(User), [{"id": u, "name": f"bench{u}", "password": password}
+                                          for u in range(1, args.users + 1)])
+        tasks, versions = [], []
+        for u in range(1, args.users + 1):
+            for k in range(1, args.personal_tasks + 1):
+                tasks.append({**task_row(k, rng, now), "id": (u - 1) * args.personal_tasks + k, "user_id": u})
+            versions.append({"key": personal_key(u), "version": args.personal_tasks})
+        await conn.execute(insert(Task), tasks)
+        await conn.execute(insert(Workspace), [{"id": w, "name": f"workspace {w}", "owner": f"bench{owner_id(shape, w)}"}
+                                               for w in range(1, args.workspaces + 1)])
+        await conn.execute(insert(Members), [{"workspace_id": w, "member": f"bench{m}"}
+                                             for w in range(1, args.workspaces + 1) for m in member_ids(shape, w)])
+        tasks = []
+        for w in range(1, args.workspaces + 1):
+            for k in range(1, args.shared_tasks + 1):
+                tasks.append({**task_row(k, rng, now), "id": (w - 1) * args.shared_tasks + k, "workspace_id": w,
+                              "created_by": f"bench{owner_id(shape, w)}"})
+            versions.append({"key": shared_key(w), "version": args.shared_tasks})
+        if tasks:
+            await conn.execute(insert(SharedTask), tasks)
+        await conn.execute(insert(CollectionVersion), versions)
+    await run_migrations()  # builds the search index over the seeded rows
+    await database.engine.dispose()
+    with open(args.db + ".json", "w") as f:
+        json.dump(shape, f, indent=2)
+    print(f"seeded {args.db} in {time.perf_counter() - started:.1f}s: {shape}")
+
+class Context:
+    """Seed shape, tokens and the rows created during the run (for delete scenarios)."""
+
+    def __init__(self, shape: dict, rng: random.Random):
+        from paths.user_manager import create_access_token
+        self.shape = shape
+        self.rng = rng
+        self._mint = create_access_token
+        self._tokens = {}
+        self.created_personal = []
+        self.created_shared = []
+        self.created_workspaces = []
+        self.added_members = []
+
+    def auth(self, user_id: int) -> dict:
+        token = self._tokens.get(user_id)
+        if token is None:
+            token = self._tokens[user_id] = self._mint({"user_name": f"bench{user_id}"})
+        return {"Authorization": f"Bearer {token}"}
+
+    def user(self) -> int:
+        return self.rng.randrange(1, self.shape["users"] + 1)
+
+    def personal_task(self):
+        user_id = self.user()
+        return user_id, (user_id - 1) * self.shape["personal_tasks"] + self.rng.randrange(1, self.shape["personal_tasks"] + 1)
+
+    def workspace(self):
+        workspace_id = self.rng.randrange(1, self.shape["workspaces"] + 1)
+        return workspace_id, self.rng.choice([owner_id(self.shape, workspace_id), *member_ids(self.shape, workspace_id)])
+
+    def shared_task(self):
+        workspace_id, user_id = self.workspace()
+        return workspace_id, user_id, (workspace_id - 1) * self.shape["shared_tasks"] + self.rng.randrange(1, self.shape["shared_tasks"] + 1)
+
+def new_task(ctx) -> dict:
+    return {"name": f"bench {ctx.rng.choice(WORDS)}", "date": "Oct 18", "priority": ctx.rng.choice(PRIORITIES)}
+
+def import_body(ctx, rows: int = 50) -> bytes:
+    return "".join(json.dumps(new_task(ctx)) + "\n" for _ in range(rows)).encode()
+
+# Each scenario returns (method, path, request kwargs, on_response) or None when it
+# has nothing left to do. They run in this order, so deletes consume what creates made.
+
+def personal_list(ctx):
+    u = ctx.user()
+    return "GET", f"/personaltasks/{u}", {"headers": ctx.auth(u)}, None
+
+def personal_list_due(ctx):
+    u = ctx.user()
+    return "GET", f"/personaltasks/{u}", {"headers": ctx.auth(u), "params": {"order_by": "due", "limit": 20}}, None
+
+def personal_changes(ctx):
+    u = ctx.user()
+    return "GET", f"/personaltasks/{u}/changes", {"headers": ctx.auth(u), "params": {"since": ctx.shape["personal_tasks"] // 2}}, None
+
+def personal_create(ctx):
+    u = ctx.user()
+    return ("POST", f"/personaltasks/{u}", {"headers": ctx.auth(u), "json": {**new_task(ctx), "user_id": u}},
+            lambda body: ctx.created_personal.append((u, body["id"])))
+
+def personal_update(ctx):
+    u, task_id = ctx.personal_task()
+    return "PUT", f"/personaltasks/{u}/{task_id}", {"headers": ctx.auth(u), "json": {"status": ctx.rng.choice(STATUSES)}}, None
+
+def personal_batch(ctx):
+    u = ctx.user()
+    ops = [{"op": "create", "task": new_task(ctx)} for _ in range(5)]
+    return "POST", f"/personaltasks/{u}/batch", {"headers": ctx.auth(u), "json": {"operations": ops}}, None
+
+def personal_export(ctx):
+    u = ctx.user()
+    return "GET", f"/personaltasks/{u}/export", {"headers": ctx.auth(u)}, None
+
+def personal_import(ctx):
+    u = ctx.user()
+    return "POST", f"/personaltasks/{u}/import", {"headers": ctx.auth(u), "content": import_body(ctx)}, None
+
+def personal_delete(ctx):
+    if not ctx.created_personal:
+        return None
+    u, task_id = ctx.created_personal.pop()
+    return "DELETE", f"/personaltasks/{u}/{task_id}", {"headers": ctx.auth(u)}, None
+
+def shared_list(ctx):
+    w, u = ctx.workspace()
+    return "GET", f"/sharedtasks/{w}", {"headers": ctx.auth(u)}, None
+
+def shared_changes(ctx):
+    w, u = ctx.workspace()
+    return "GET", f"/sharedtasks/{w}/changes", {"headers": ctx.auth(u), "params": {"since": ctx.shape["shared_tasks"] // 2}}, None
+
+def shared_create(ctx):
+    w, u = ctx.workspace()
+    return ("POST", f"/sharedtasks/{w}", {"headers": ctx.auth(u), "json": {**new_task(ctx), "workspace_id": w}},
+            lambda body: ctx.created_shared.append((w, u, body["id"])))
+
+def shared_update(ctx):
+    w, u, task_id = ctx.shared_task()
+    return "PUT", f"/sharedtasks/{w}/{task_id}", {"headers": ctx.auth(u), "json": {"status": ctx.rng.choice(STATUSES)}}, None
+
+def shared_batch(ctx):
+    w, u = ctx.workspace()
+    ops = [{"op": "create", "task": new_task(ctx)} for _ in range(5)]
+    return "POST", f"/sharedtasks/{w}/batch", {"headers": ctx.auth(u), "json": {"operations": ops}}, None
+
+def shared_export(ctx):
+    w, u = ctx.workspace()
+    return "GET", f"/sharedtasks/{w}/export", {"headers": ctx.auth(u)}, None
+
+def shared_import(ctx):
+    w, u = ctx.workspace()
+    return "POST", f"/sharedtasks/{w}/import", {"headers": ctx.auth(u), "content": import_body(ctx)}, None
+
+def shared_delete(ctx):
+    if not ctx.created_shared:
+        return None
+    w, u, task_id = ctx.created_shared.pop()
+    return "DELETE", f"/sharedtasks/{w}/{task_id}", {"headers": ctx.auth(u)}, None
+
+def workspaces_list(ctx):
+    u = ctx.user()
+    return "GET", "/workspaces/", {"headers": ctx.auth(u)}, None
+
+def workspaces_summary(ctx):
+    u = ctx.user()
+    return "GET", "/workspaces/summary", {"headers": ctx.auth(u)}, None
+
+def workspace_create(ctx):
+    u = ctx.user()
+    name = f"bench {uuid.uuid4().hex[:12]}"
+    return ("POST", "/workspaces/", {"headers": ctx.auth(u), "json": {"name": name, "owner": f"bench{u}"}},
+            lambda body: ctx.created_workspaces.append((body, u)))
+
+def member_add(ctx):
+    if not ctx.created_workspaces:
+        return None
+    w, owner = ctx.rng.choice(ctx.created_workspaces)
+    member = ctx.user()
+    if member == owner or (w, member) in ctx.added_members:
+        return None
+    ctx.added_members.append((w, member))
+    return ("POST", f"/workspaces/{w}/members", {"headers": ctx.auth(owner), "json": {"workspace_id": w, "member": f"bench{member}"}},
+            None)
+
+def member_delete(ctx):
+    if not ctx.added_members:
+        return None
+    w, member = ctx.added_members.pop()
+    owner = next(o for ws, o in ctx.created_workspaces if ws == w)
+    return "DELETE", f"/workspaces/{w}/members/bench{member}", {"headers": ctx.auth(owner)}, None
+
+def workspace_delete(ctx):
+    if not ctx.created_workspaces:
+        return None
+    w, owner = ctx.created_workspaces.pop()
+    return "DELETE", f"/workspaces/{w}", {"headers": ctx.auth(owner)}, None
+
+def user_verify(ctx):
+    u = ctx.user()
+    return "GET", "/users/verify", {"headers": ctx.auth(u)}, None
+
+def user_login(ctx):
+    return "POST", "/users/login/", {"json": {"name": f"bench{ctx.user()}", "password": PASSWORD}}, None
+
+def user_register(ctx):
+    return "POST", "/users/register/", {"json": {"name": f"bench-new-{uuid.uuid4().hex}", "password": PASSWORD}}, None
+
+def search(ctx):
+    u = ctx.user()
+    return "GET", "/search/", {"headers": ctx.auth(u), "params": {"q": ctx.rng.choice(WORDS)[:5]}}, None
+
+# name -> (scenario, cap on requests; argon2 routes are capped so a run stays short)
+SCENARIOS = {
+    "personaltasks.list": (personal_list, None),
+    "personaltasks.list_due": (personal_list_due, None),
+    "personaltasks.changes": (personal_changes, None),
+    "personaltasks.create": (personal_create, None),
+    "personaltasks.update": (personal_update, None),
+    "personaltasks.batch": (personal_batch, None),
+    "personaltasks.export": (personal_export, 100),
+    "personaltasks.import": (personal_import, 100),
+    "personaltasks.delete": (personal_delete, None),
+    "sharedtasks.list": (shared_list, None),
+    "sharedtasks.changes": (shared_changes, None),
+    "sharedtasks.create": (shared_create, None),
+    "sharedtasks.update": (shared_update, None),
+    "sharedtasks.batch": (shared_batch, None),
+    "sharedtasks.export": (shared_export, 100),
+    "sharedtasks.import": (shared_import, 100),
+    "sharedtasks.delete": (shared_delete, None),
+    "workspaces.list": (workspaces_list, None),
+    "workspaces.summary": (workspaces_summary, None),
+    "workspaces.create": (workspace_create, None),
+    "workspaces.add_member": (member_add, None),
+    "workspaces.delete_member": (member_delete, None),
+    "workspaces.delete": (workspace_delete, None),
+    "users.verify": (user_verify, None),
+    "users.login": (user_login, 100),
+    "users.register": (user_register, 100),
+    "search": (search, None),
+}
+
+def percentile(ms: list, p: float) -> float:
+    return ms[min(len(ms) - 1, int(len(ms) * p))] if ms else 0.0
+
+async def run_scenario(client, ctx, scenario, requests: int, concurrency: int) -> dict:
+    timings, errors = [], {}
+    remaining = [requests]
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            request = scenario(ctx)
+            if request is None:
+                continue
+            method, path, kwargs, on_response = request
+            start = time.perf_counter()
+            try:
+                r = await client.request(method, path, **kwargs)
+            except Exception as e:  # a benchmark keeps going and reports it
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                continue
+            elapsed = time.perf_counter() - start
+            if r.status_code >= 400:
+                errors[str(r.status_code)] = errors.get(str(r.status_code), 0) + 1
+                continue
+            timings.append(elapsed)
+            if on_response:
+                on_response(r.json())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    ms = sorted(t * 1000 for t in timings)
+    return {
+        "requests": len(ms),
+        "errors": errors,
+        "throughput_rps": round(len(ms) / wall, 1) if wall else 0.0,
+        "p50_ms": round(percentile(ms, 0.50), 2),
+        "p95_ms": round(percentile(ms, 0.95), 2),
+        "p99_ms": round(percentile(ms, 0.99), 2),
+        "max_ms": round(ms[-1], 2) if ms else 0.0,
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+async def run(args):
+    with open(args.db + ".json") as f:
+        shape = json.load(f)
+    use_database(args.db)
+    import httpx
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if args.mode == "inproc":
+        import main
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench", timeout=60)
+        lifespan = main.app.router.lifespan_context(main.app)
+    else:
+        client = httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60)
+        lifespan = None
+    ctx = Context(shape, random.Random(args.seed))
+    selected = [name for name in SCENARIOS if not args.only or any(name.startswith(prefix) for prefix in args.only)]
+    results = {}
+    if lifespan:
+        await lifespan.__aenter__()
+    try:
+        async with client:
+            for name in selected:
+                scenario, cap = SCENARIOS[name]
+                requests = min(args.requests, cap) if cap else args.requests
+                if args.warmup and name.split(".")[-1] in ("list", "list_due", "changes", "summary", "verify"):
+                    await run_scenario(client, ctx, scenario, args.warmup, args.concurrency)
+                results[name] = result = await run_scenario(client, ctx, scenario, requests, args.concurrency)
+                errors = f"  errors {result['errors']}" if result["errors"] else ""
+                print(f"{name:<28} {result['throughput_rps']:>8.1f} req/s  p50 {result['p50_ms']:>7.2f}  "
+                      f"p95 {result['p95_ms']:>7.2f}  p99 {result['p99_ms']:>7.2f} ms{errors}")
+    finally:
+        if lifespan:
+            await lifespan.__aexit__(None, None, None)
+
+    commit = git_commit()
+    report = {
+        "meta": {"commit": commit, "mode": args.mode, "url": args.url if args.mode == "http" else None,
+                 "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                 "concurrency": args.concurrency, "requests": args.requests, "seed": args.seed, "shape": shape,
+                 "python": platform.python_version(), "platform": platform.platform()},
+        "results": results,
+    }
+    out = args.out or os.path.join(ROOT, "benchmarks", "results",
+                                   f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit}-{args.mode}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {out}")
+
+def compare(args) -> int:
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']}  (p95 regressions over {args.threshold:g}% are flagged)")
+    print(f"{'route':<28} {'p50 ms':>18} {'p95 ms':>18} {'req/s':>16} {'p95':>7}")
+    regressions = 0
+    for name in sorted(set(old["results"]) & set(new["results"])):
+        a, b = old["results"][name], new["results"][name]
+        change = (b["p95_ms"] - a["p95_ms"]) / a["p95_ms"] * 100 if a["p95_ms"] else 0.0
+        flag = "  <-- slower" if change > args.threshold else ""
+        regressions += bool(flag)
+        print(f"{name:<28} {a['p50_ms']:>7.2f} -> {b['p50_ms']:>7.2f} {a['p95_ms']:>7.2f} -> {b['p95_ms']:>7.2f} "
+              f"{a['throughput_rps']:>6.0f} -> {b['throughput_rps']:>6.0f} {change:+6.1f}%{flag}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    default_db = os.path.join(ROOT, "benchmarks", "bench.db")
+
+    p = commands.add_parser("seed", help="build the benchmark database")
+    p.add_argument("--db", default=default_db)
+    p.add_argument("--users", type=int, default=2000)
+    p.add_argument("--workspaces", type=int, default=500)
+    p.add_argument("--members", type=int, default=4, help="members per workspace, besides the owner")
+    p.add_argument("--personal-tasks", type=int, default=25, help="per user")
+    p.add_argument("--shared-tasks", type=int, default=40, help="per workspace")
+    p.add_argument("--seed", type=int, default=1)
+
+    p = commands.add_parser("run", help="benchmark every route")
+    p.add_argument("--db", default=default_db)
+    p.add_argument("--mode", choices=["inproc", "http"], default="inproc")
+    p.add_argument("--url", default="http://127.0.0.1:8000")
+    p.add_argument("--requests", type=int, default=500, help="per route")
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--warmup", type=int, default=20, help="untimed requests before each read route")
+    p.add_argument("--only", nargs="*", help="route name prefixes, e.g. sharedtasks workspaces.list")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--out")
+
+    p = commands.add_parser("compare", help="diff two result files")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--threshold", type=float, default=10.0, help="percent")
+
+    args = parser.parse_args()
+    if args.command == "seed":
+        asyncio.run(seed(args))
+    elif args.command == "run":
+        asyncio.run(run(args))
+    else:
+        sys.exit(compare(args))
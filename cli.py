@@ -1,11 +1,123 @@
 import curses
-import os
-import requests
+import queue
+import sys
 from fetch_backend import*
+from local_store import PERSONAL, SHARED, open_local, close_local
+from render import Frame, centered
 LOGOUT = "LOGOUT"
 QUIT = "QUIT"
+POLL_MS = 200  # how often an idle screen checks for background results
+PAGE_ROWS = 200  # task rows read from the local store at a time
+
+# Network calls run on worker threads; their messages come back through this queue
+_executor = None
+_messages = queue.Queue()
+
+def in_background(fn, *args):
+    global _executor
+    if _executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="taskline-net")
+    def job():
+        try:
+            msg = fn(*args)
+        except requests.RequestException:
+            msg = "Network error, try again"
+        if msg:
+            _messages.put(msg)
+    _executor.submit(job)
+
+def wait_key(stdscr, store):
+    """getch that also returns -1 once background work changed something worth redrawing."""
+    stdscr.timeout(POLL_MS)
+    seen = store.revision
+    while True:
+        k = stdscr.getch()
+        if k != -1 or store.revision != seen or not _messages.empty():
+            return k
+
+def status_text(store, sync, message):
+    queued = store.outbox_count()
+    if message:
+        return message
+    if not sync.online:
+        return f"Offline - {queued} change(s) queued" if queued else "Offline"
+    return f"Syncing {queued} change(s)..." if queued else ""
+
+def status_row(stdscr, text):
+    height, width = stdscr.getmaxyx()
+    return {height-1: (0, text, curses.A_BOLD | curses.A_REVERSE)} if text else {}
+
+def task_row(task, shared):
+    """(text, attr) of a task line; built when the list changes, not on every frame."""
+    checkbox = "[x]" if task["status"] == "completed" else "[ ]"
+    checkbox += "*" if task.get("pending") else " "  # * = not yet on the server
+    line = f"{checkbox}{task['name']:<40} {task['priority']:<10} {task['date']:<8}"
+    if shared:
+        line += f"  [{task.get('created_by', '')}]"
+    attr = curses.color_pair(1) if task['priority'] == "High" else curses.A_NORMAL
+    if task["status"] == "completed":
+        attr |= curses.A_DIM
+    return line, attr
+
+class TaskWindow:
+    """The slice of a task list around the cursor, read from the local store on demand.
+
+    Only the count and one page of (id, line, attr) tuples are held, so memory does
+    not grow with the list; the page is re-read when the view gets within a screen
+    of its edge or the store changes.
+    """
+
+    def __init__(self, store, scope, scope_id, shared):
+        self.store = store
+        self.scope = scope
+        self.scope_id = scope_id
+        self.shared = shared
+        self.count = 0
+        self.start = 0
+        self.rows = []
+        self.loaded = None
+
+    def refresh(self):
+        if self.store.revision != self.loaded:
+            self.loaded = self.store.revision
+            self.count = self.store.count_tasks(self.scope, self.scope_id)
+            self.rows = None
+
+    def visible(self, offset, height):
+        end = min(offset + height, self.count)
+        if self.rows is None or (offset - self.start < height and self.start > 0) or \
+                (self.start + len(self.rows) - end < height and self.start + len(self.rows) < self.count):
+            page = max(PAGE_ROWS, 4 * height)
+            self.start = max(0, offset - (page - height) // 2)
+            tasks = self.store.task_page(self.scope, self.scope_id, self.start, page)
+            self.rows = [(task["id"], *task_row(task, self.shared)) for task in tasks]
+        return self.rows[offset - self.start:end - self.start]
+
+    def task(self, index):
+        """Full task at a visible index, or None."""
+        if self.rows and 0 <= index - self.start < len(self.rows):
+            return self.store.task(self.scope, self.scope_id, self.rows[index - self.start][0])
+
+def hit_row(hit):
+    where = "personal" if hit["scope"] == "personal" else hit.get("workspace_name") or f"workspace {hit['workspace_id']}"
+    checkbox = "[x]" if hit["status"] == "completed" else "[ ]"
+    return f"{checkbox} {hit['name']:<40} {hit['priority']:<10} {where}"
+
+def workspace_row(ws, username):
+    role = "Owner" if ws["owner"] == username else "Member"
+    members = ", ".join(ws["members"]) if ws["members"] else "—"
+    counts = ws.get("counts") or {}
+    return (
+        f"{ws['name']:<20} "
+        f"{ws['owner']:<15} "
+        f"{role:<10} "
+        f"{counts.get('open', '-'):>5} {counts.get('completed', '-'):>5} {counts.get('high', '-'):>5}  "
+        f"{members}"
+    )
 
 def get_input(stdscr, prompt):
+    stdscr.timeout(-1)
     curses.echo()
     height, width = stdscr.getmaxyx()
     stdscr.move(height-2,0)
@@ -16,88 +128,153 @@ def get_input(stdscr, prompt):
     curses.noecho()
     return user_input.strip()
 
+def search_ui(stdscr, token):
+    """Incremental search over all visible tasks; returns the chosen hit or None."""
+    curses.set_escdelay(25)  # Esc closes the prompt without the default 1s wait
+    query, hits, lines, selected, message = "", [], [], 0, ""
+    results = queue.Queue()
+    sent = answered = None
+    frame = Frame(stdscr)
+    while True:
+        while not _messages.empty():
+            message = _messages.get_nowait()
+        while not results.empty():
+            for_query, found = results.get_nowait()
+            if for_query == query:  # drop answers to stale prefixes
+                hits, selected, answered = found, 0, for_query
+                lines = [hit_row(hit) for hit in hits]
+        height, width = stdscr.getmaxyx()
+        rows = {0: (0, " Search: type to filter, Up/Down to pick, Enter=open, Esc=back", curses.A_BOLD),
+                2: (0, f"/{query}", curses.A_NORMAL)}
+        for idx, line in enumerate(lines[:max(0, height - 5)]):
+            rows[4 + idx] = (0, line, curses.A_REVERSE if idx == selected else curses.A_NORMAL)
+        if query and not hits and answered == query:
+            rows[4] = (0, " No matches", curses.A_DIM)
+        rows.update(status_row(stdscr, message))
+        frame.draw(rows, cursor=(2, min(len(query) + 1, width - 1)))
+
+        stdscr.timeout(POLL_MS)
+        k = stdscr.getch()
+        if k == -1:
+            # typing paused: ask the server about the current text
+            if query and query != sent:
+                sent = query
+                def lookup(q=query):
+                    try:
+                        results.put((q, search_tasks(q, token)["hits"]))
+                    except ValueError:
+                        return "Search failed"
+                in_background(lookup)
+        else:
+            message = ""
+        if k == 27:
+            return None
+        elif k in (10, 13, curses.KEY_ENTER):
+            if hits:
+                return hits[selected]
+        elif k == curses.KEY_UP and selected > 0:
+            selected -= 1
+        elif k == curses.KEY_DOWN and selected < len(hits) - 1:
+            selected += 1
+        elif k in (curses.KEY_BACKSPACE, 127, 8):
+            query = query[:-1]
+            if not query:
+                hits, lines = [], []
+        elif 32 <= k < 127:
+            query += chr(k)
+
 
 def task_management_ui(stdscr,session,token,user,id,mode:str):
     cursor = 0
     offset = 0
     curses.init_pair(1, curses.COLOR_RED, curses.COLOR_BLACK)  # high priority
+    scope = PERSONAL if mode == "personal" else SHARED
+    store, sync = open_local(session, _messages.put)
+    sync.watch(scope, id)
+    if scope == SHARED:
+        sync.subscribe(id)
+    message = ""
+    shared = mode != "personal"
+    title = f"Task Line - {user['name']}"
+    instructions = " Instructions: a=Add, u=Update, Space=Toggle Complete, d=Delete, /=Search, q=Quit, r=reload"
+    if shared:
+        header = f"{'':3} {'Name':<40} {'Priority':<10} {'Date':<8}  {'Created By'}"
+    else:
+        header = f"{'':3} {'Name':<40} {'Priority':<10} {'Date':<8}"
+    frame = Frame(stdscr)
+    # rendered from the local mirror; sync runs in the background
+    window = TaskWindow(store, scope, id, shared)
 
     while True:
-        stdscr.clear()
-        if mode == "personal":
-          tasks = fetch_personal_tasks(id, token)
-        else:
-            tasks = fetch_shared_tasks(id,token)
-        num_tasks = len(tasks)
+        while not _messages.empty():
+            message = _messages.get_nowait()
+        window.refresh()
+        num_tasks = window.count
+        cursor = min(cursor, max(num_tasks - 1, 0))  # the list may have shrunk under us
         height, width = stdscr.getmaxyx()
         display_height = height - 6
 
-        # Title and instructions
-        title = f"Task Line - {user['name']}"
-        if mode != "personal":
-            title+=f"\n Workspace: {mode}"
-        x = (width - len(title)) // 2
-        stdscr.addstr(0, x, title, curses.A_BOLD | curses.A_UNDERLINE)
-        stdscr.addstr(2, 0, " Instructions: a=Add, u=Update, Space=Toggle Complete, d=Delete, q=Quit, r=reload")
-
         # Scrolling
         if cursor < offset:
             offset = cursor
         elif cursor >= offset + display_height:
             offset = cursor - display_height + 1
-        header_y = 4
 
-        if mode != "personal":
-            header = f"{'':3} {'Name':<40} {'Priority':<10} {'Date':<8}  {'Created By'}"
-        else:
-            header = f"{'':3} {'Name':<40} {'Priority':<10} {'Date':<8}"
-
-        stdscr.addstr(header_y, 0, header[:width-1], curses.A_BOLD)
-
-        # Display tasks
-        for idx in range(offset, min(offset + display_height, num_tasks)):
-            task = tasks[idx]
-            checkbox = "[x]" if task["status"] == "completed" else "[ ]"
-            
-            if mode != "personal":
-                line = f"{checkbox} {task['name']:<40} {task['priority']:<10} {task['date']:<8}  [{task.get('created_by', '')}]"
-            else:
-                line = f"{checkbox} {task['name']:<40} {task['priority']:<10} {task['date']:<8}"
-            
-            y = 5 + idx - offset
-            attr = curses.A_REVERSE if idx == cursor else curses.A_NORMAL
-            if task['priority'] == "High":
-                attr |= curses.color_pair(1)
-            if task["status"] == "completed":
-                attr |= curses.A_DIM
-            stdscr.addstr(y, 0, line[:width-1], attr)
-
-
-        stdscr.refresh()
-        k = stdscr.getch()
+        rows = {0: centered(width, title, curses.A_BOLD | curses.A_UNDERLINE),
+                2: (0, instructions, curses.A_NORMAL),
+                4: (0, header, curses.A_BOLD)}
+        if shared:
+            rows[1] = (0, f" Workspace: {mode}", curses.A_NORMAL)
+        for idx, (_, line, attr) in enumerate(window.visible(offset, display_height), offset):
+            rows[5 + idx - offset] = (0, line, (attr | curses.A_REVERSE) if idx == cursor else attr)
+        if num_tasks > display_height:
+            rows[3] = (0, f" {cursor + 1}/{num_tasks}", curses.A_DIM)
+        rows.update(status_row(stdscr, status_text(store, sync, message)))
+        frame.draw(rows)
+        k = wait_key(stdscr, store)
+        if k != -1:
+            message = ""
 
         # Navigation and actions
         if k == curses.KEY_UP and cursor > 0:
             cursor -= 1
         elif k == curses.KEY_DOWN and cursor < num_tasks - 1:
             cursor += 1
+        elif k == curses.KEY_PPAGE:
+            cursor = max(cursor - display_height, 0)
+        elif k == curses.KEY_NPAGE:
+            cursor = max(min(cursor + display_height, num_tasks - 1), 0)
+        elif k == curses.KEY_HOME:
+            cursor = 0
+        elif k == curses.KEY_END:
+            cursor = max(num_tasks - 1, 0)
         elif k == ord("r"):
+            sync.notify()
             continue
         elif k == ord("q"):
+            sync.unsubscribe()
             break
-        elif k == ord("d") and tasks:
-            if mode == "personal":
-               delete_personal_task(tasks[cursor]["id"], id, token)
-            else:
-               delete_shared_task(tasks[cursor]["id"], id, token)
-            if cursor >= len(tasks) - 1 and cursor > 0:
+        elif k == ord("/"):
+            hit = search_ui(stdscr, token)
+            frame.invalidate()
+            if hit:
+                here = hit["scope"] == "personal" if scope == PERSONAL else hit.get("workspace_id") == id
+                position = store.task_position(scope, id, hit["id"]) if here else None
+                if position is not None:
+                    cursor = position
+                elif not here:
+                    where = "personal tasks" if hit["scope"] == "personal" else f"workspace {hit.get('workspace_name')}"
+                    message = f"'{hit['name']}' is in {where}"
+        elif k == ord("d") and window.task(cursor):
+            store.delete_task(scope, id, window.task(cursor)["id"])
+            sync.notify()
+            if cursor >= num_tasks - 1 and cursor > 0:
                 cursor -= 1
         elif k == ord(" "):  # toggle completed
-            if tasks:
-                if mode == "personal":
-                    toggle_personal_task(tasks[cursor], id, token)
-                else:
-                    toggle_shared_task(tasks[cursor], id, token)
+            task = window.task(cursor)
+            if task:
+                store.toggle_task(scope, id, task)
+                sync.notify()
         elif k == ord("a") and user:
             name = get_input(stdscr, "Enter task name: ")
             while True:
@@ -105,13 +282,12 @@ def task_management_ui(stdscr,session,token,user,id,mode:str):
                 if prio_input in ["N","H"]:
                     priority = "Normal" if prio_input=="N" else "High"
                     break
-            if mode == "personal":
-                add_personal_task(name, priority, id, token)
-            else:
-                add_shared_task(name, priority, id, token)
+            store.add_task(scope, id, name, priority, created_by=user["name"])
+            sync.notify()
+            frame.invalidate()
                 
-        elif k == ord("u") and tasks:
-            task = tasks[cursor]
+        elif k == ord("u") and window.task(cursor):
+            task = window.task(cursor)
             name = get_input(stdscr, f"Update name ({task['name']}): ") or task["name"]
             while True:
                 prio_input = get_input(stdscr, f"Update priority ({task['priority']})? [n]ormal/[h]igh: ").upper()
@@ -121,10 +297,9 @@ def task_management_ui(stdscr,session,token,user,id,mode:str):
                 elif prio_input == "":
                     priority = task["priority"]
                     break
-            if mode == "personal":
-                update_personal_task(task["id"], name, priority, id, token)
-            else:
-                update_shared_task(task["id"], name, priority, id, token)
+            store.update_task(scope, id, task["id"], name=name, priority=priority)
+            sync.notify()
+            frame.invalidate()
     
 
 # Personal Task Menu  
@@ -140,23 +315,43 @@ def shared_workspace_menu(stdscr, session):
     user = session['user']
     username = user["name"]
     curses.curs_set(0)
+    store, sync = open_local(session, _messages.put)
+    message = ""
+
+    def then_refresh(fn, *args):
+        # workspace calls run off the UI thread; the mirror is refreshed before the redraw
+        def job():
+            msg = fn(*args)
+            sync.pull("workspaces", 0)
+            return msg
+        return job
+
+    def create_with_members(name, members):
+        wid = create_workspace(name, username, token)
+        if not wid:
+            return "Error creating workspace"
+        for member_name in members:
+            add_workspace_member(wid, member_name, token)
+        return f"Created {name}"
     
-    while True:
-        workspaces = list(fetch_workspaces(token).values() or [])
-        num_ws = len(workspaces)
-        cursor = 0
-        offset = 0
-        height, width = stdscr.getmaxyx()
-        display_height = height - 6
+    header = f"{'Name':<20} {'Owner':<15} {'Role':<10} {'Open':>5} {'Done':>5} {'High':>5}  {'Members'}"
+    cursor = 0
+    offset = 0
+    frame = Frame(stdscr)
+    loaded = None
 
+    while True:
         while True:
-            # Fetch workspaces every iteration to refresh
-            workspaces_dict = fetch_workspaces(token) or {}   # fetch dict from backend
-            workspaces = list(workspaces_dict.values())   # convert to list
+            # Local mirror; the sync worker keeps it current
+            if store.revision != loaded:
+                loaded = store.revision
+                workspaces = list(store.workspaces(username).values())
+                lines = [workspace_row(ws, username) for ws in workspaces]
             num_ws = len(workspaces)
-            stdscr.clear()
-            stdscr.addstr(0, (width-25)//2, "Shared Workspaces", curses.A_BOLD | curses.A_UNDERLINE)
-            stdscr.addstr(2, 0, "Instructions: Enter=Open, a=Add, d=Delete, m=Add/Remove Members , q=Back, r=Reload")
+            while not _messages.empty():
+                message = _messages.get_nowait()
+            height, width = stdscr.getmaxyx()
+            display_height = height - 6
 
             # Ensure cursor is valid
             if num_ws == 0:
@@ -170,33 +365,17 @@ def shared_workspace_menu(stdscr, session):
             elif cursor >= offset + display_height:
                 offset = cursor - display_height + 1
 
-            # Table header
-            header_y = 3
-            stdscr.addstr(header_y + 1, 0,
-                f"{'Name':<20} {'Owner':<15} {'Role':<10} {'Members'}",
-                curses.A_BOLD)            
-            start_y = header_y + 3
-            
-            # Table rows
+            rows = {0: centered(width, "Shared Workspaces", curses.A_BOLD | curses.A_UNDERLINE),
+                    2: (0, "Instructions: Enter=Open, a=Add, d=Delete, m=Add/Remove Members , q=Back, r=Reload", curses.A_NORMAL),
+                    4: (0, header, curses.A_BOLD)}
+            start_y = 6
             for idx in range(offset, min(offset + display_height, num_ws)):
-                ws = workspaces[idx]
-                
-                role = "Owner" if ws["owner"] == username else "Member"
-                members = ", ".join(ws["members"]) if ws["members"] else "—"
-                
-                line = (
-                    f"{ws['name']:<20} "
-                    f"{ws['owner']:<15} "
-                    f"{role:<10} "
-                    f"{members}"
-                )
-                
-                attr = curses.A_REVERSE if idx == cursor else curses.A_NORMAL
-                stdscr.addstr(start_y + idx - offset, 0, line[:width - 1], attr)
-
-
-            stdscr.refresh()
-            k = stdscr.getch()
+                rows[start_y + idx - offset] = (0, lines[idx], curses.A_REVERSE if idx == cursor else curses.A_NORMAL)
+            rows.update(status_row(stdscr, status_text(store, sync, message)))
+            frame.draw(rows)
+            k = wait_key(stdscr, store)
+            if k != -1:
+                message = ""
 
             if k == curses.KEY_UP and cursor > 0:
                 cursor -= 1
@@ -207,31 +386,27 @@ def shared_workspace_menu(stdscr, session):
             elif k in [10, 13] and num_ws > 0:  # Enter: open workspace tasks
                 ws = workspaces[cursor]
                 task_management_ui(stdscr,session,token,user,ws["workspace_id"],ws["name"])
+                frame.invalidate()
             elif k == ord("r"):
+                sync.notify()
                 continue
             elif k == ord("a"):  # create workspace
                 name = get_input(stdscr, "Workspace name: ")
-                wid = create_workspace(name, username, token)
-                if wid:
+                if name:
+                    members = []
                     while True:
                         add_more = get_input(stdscr, "Add a member? (y/n): ").lower()
                         if add_more != "y":
                             break
-                        member_name = get_input(stdscr, "Enter member username: ")
-                        add_workspace_member(wid, member_name, token)
+                        members.append(get_input(stdscr, "Enter member username: "))
+                    message = f"Creating {name}..."
+                    in_background(then_refresh(create_with_members, name, members))
+                frame.invalidate()
 
             elif k == ord("d") and num_ws > 0:  # delete workspace
                 ws = workspaces[cursor]
-                msg = delete_workspace(ws["workspace_id"], token)
-                height, width = stdscr.getmaxyx()
-                stdscr.addstr(
-                    height-2,
-                    2,
-                    msg[:width-4],
-                    curses.A_BOLD | curses.A_REVERSE
-                )
-                stdscr.refresh()
-                curses.napms(1500) 
+                message = f"Deleting {ws['name']}..."
+                in_background(then_refresh(delete_workspace, ws["workspace_id"], token))
             elif k == ord("m") and num_ws > 0:  # manage members
                 ws = workspaces[cursor]
             
@@ -239,9 +414,11 @@ def shared_workspace_menu(stdscr, session):
                     stdscr.addstr(height-2, 0, "Options: a=Add Member, r=Remove Member, b=Back")
                     stdscr.refresh()
             
+                    stdscr.timeout(-1)
                     action = stdscr.getch()
             
                     if action == ord("b"):  # back to workspace menu
+                        frame.invalidate()
                         break
             
                     elif action == ord("a") and ws["owner"] == username:
@@ -253,17 +430,7 @@ def shared_workspace_menu(stdscr, session):
                             member_name = get_input(stdscr, "")
                             if not member_name:
                                 break
-                            msg = add_workspace_member(ws["workspace_id"], member_name, token)
-                            height, width = stdscr.getmaxyx()
-                            stdscr.addstr(
-                                height-3,
-                                2,
-                                msg[:width-4],
-                                curses.A_BOLD | curses.A_REVERSE
-                            )
-                            stdscr.refresh()
-                            curses.napms(1000) 
-                            continue  
+                            in_background(then_refresh(add_workspace_member, ws["workspace_id"], member_name, token))
             
                     elif action == ord("r"):
                         # Remove member form at bottom
@@ -275,25 +442,27 @@ def shared_workspace_menu(stdscr, session):
                             if not member_name:
                                 break
                             if member_name in ws["members"]:
-                                msg = remove_workspace_member(ws["workspace_id"], member_name, token)
-                                height, width = stdscr.getmaxyx()
-                                stdscr.addstr(
-                                    height-3,
-                                    2,
-                                    msg[:width-4],
-                                    curses.A_BOLD | curses.A_REVERSE
-                                )
-                                stdscr.refresh()
-                                curses.napms(1000)
-                                continue
+                                in_background(then_refresh(remove_workspace_member, ws["workspace_id"], member_name, token))
 
 
+def verify_in_background(session):
+    """Confirm the cached token with the server without holding up the first frame."""
+    def verify():
+        try:
+            ok = verify_session(session)
+        except requests.RequestException:
+            return  # offline; the local store keeps working and sync retries on its own
+        if not ok:
+            session["expired"] = True
+            return "Session expired, please log in again"
+    in_background(verify)
+
 def run_main():
     while True:
-        os.system('cls' if os.name == 'nt' else 'clear')
-        
         session = load_session()
-        if not session:
+        if session:
+            verify_in_background(session)
+        else:
             session = login_or_register()
             if not session:
                 return  # user chose quit at login
@@ -321,6 +490,7 @@ def main_curses(stdscr, session):
     
         win = curses.newwin(height, width, PAD_Y, PAD_X)
         win.keypad(True)
+        win.timeout(POLL_MS)
             
         title = f"Task Line CLI - {session['user']['name']}"
         win.addstr(0,(width-len(title))//2,title,curses.A_BOLD|curses.A_UNDERLINE)
@@ -331,17 +501,65 @@ def main_curses(stdscr, session):
         win.addstr(6, 2, "q. Quit")
         win.refresh()
         k = win.getch()
+        while k == -1 and not session.get("expired"):
+            k = win.getch()
+        if session.get("expired"):  # rejected by the background verification
+             while not _messages.empty():
+                 _messages.get_nowait()
+             close_local(wipe=True)
+             clear_session()
+             return LOGOUT
         if k==ord("1"):
             personal_task_menu(win, session)
         elif k==ord("2"):
             shared_workspace_menu(win, session)
         elif k==ord("l"):  # Explicit logout
+             close_local(wipe=True)
              clear_session()
              return LOGOUT
         elif k==ord("q"):  # Exit program but keep JWT valid
+             close_local()
              return QUIT
 
-    
+
+def transfer_main(argv):
+    """taskline export|import FILE [--workspace NAME] [--format jsonl|csv]"""
+    import argparse
+    parser = argparse.ArgumentParser(prog="taskline", description="Without arguments, opens the task manager.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help in (("export", "write tasks to FILE"), ("import", "add the tasks in FILE")):
+        command = commands.add_parser(name, help=help)
+        command.add_argument("file")
+        command.add_argument("-w", "--workspace", help="a shared workspace (name or id) instead of your personal tasks")
+        command.add_argument("-f", "--format", choices=("jsonl", "csv"), help="default: from the file extension, else jsonl")
+    args = parser.parse_args(argv)
+
+    session = load_session()
+    if not session:
+        sys.exit("Not logged in; run taskline first")
+    token, user = session["token"], session["user"]
+    fmt = args.format or ("csv" if args.file.lower().endswith(".csv") else "jsonl")
+    try:
+        workspace_id = None
+        if args.workspace:
+            found = [ws for ws in fetch_workspaces(token).values() if args.workspace in (ws["name"], str(ws["workspace_id"]))]
+            if not found:
+                sys.exit(f"No workspace {args.workspace!r}")
+            workspace_id = found[0]["workspace_id"]
+        if args.command == "export":
+            written = export_tasks(args.file, fmt, token, user["id"], workspace_id)
+            print(f"Exported to {args.file} ({written // 1024} KiB)")
+        else:
+            result = import_tasks(args.file, fmt, token, user["id"], workspace_id)
+            print(f"Imported {result['imported']} task(s), skipped {result['rejected']}")
+            for error in result["errors"]:
+                print(f"  {error}")
+    except (ValueError, OSError, requests.RequestException) as e:
+        sys.exit(f"{args.command} failed: {e}")
+
 if __name__=="__main__":
-    run_main()
+    if sys.argv[1:]:
+        transfer_main(sys.argv[1:])
+    else:
+        run_main()
 
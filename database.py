@@ -1,22 +1,172 @@
 from typing import Annotated
-from sqlmodel import SQLModel, Session
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 from fastapi import Depends
-from sqlalchemy import create_engine
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+from uuid import uuid4
 import os
+import threading
+import time
 
 pssd = os.getenv("NEON_TOKEN")
-sqlite_file_name = "task.db"
-#sqlite_url = f"sqlite:///{sqlite_file_name}"
-sqlite_url = f'postgresql://{pssd}/neondb?sslmode=require&channel_binding=require'
+sqlite_file_name = os.getenv("SQLITE_PATH", "task.db")
 
-engine = create_engine(sqlite_url)
+def database_url() -> str:
+    """DATABASE_URL if set, else Neon or a local SQLite file depending on DB_BACKEND."""
+    url = os.getenv("DATABASE_URL")
+    if url:
+        # accept plain sync-style URLs and pick the async driver
+        for plain, driver in (("postgresql://", "postgresql+asyncpg://"), ("postgres://", "postgresql+asyncpg://"),
+                              ("sqlite://", "sqlite+aiosqlite://")):
+            if url.startswith(plain):
+                return driver + url[len(plain):]
+        return url
+    if os.getenv("DB_BACKEND", "postgres") == "sqlite":
+        return f"sqlite+aiosqlite:///{sqlite_file_name}"
+    # asyncpg takes ssl=require in place of libpq's sslmode/channel_binding
+    return f'postgresql+asyncpg://{pssd}/neondb?ssl=require'
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+sqlite_url = database_url()
 
-def get_session():
-    with Session(engine) as session:
+# Neon suspends idle computes and drops their connections, so by default
+# connections are pinged on checkout and recycled before the ~5 min idle cutoff.
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 240))
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 0))
+# set when connecting through a transaction-mode pgbouncer such as Neon's -pooler host
+PGBOUNCER = os.getenv("DB_PGBOUNCER", "0") == "1"
+
+class PoolStats:
+    """Counters for connection checkouts; the pool itself reports current sizes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.connects = 0
+            self.invalidations = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self, pool) -> dict:
+        with self._lock:
+            result = {
+                "checkouts": self.checkouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+            }
+        # StaticPool/NullPool have no sizes to report
+        for name in ("size", "checkedin", "checkedout", "overflow"):
+            if hasattr(pool, name):
+                result[name] = getattr(pool, name)()
+        return result
+
+pool_stats = PoolStats()
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    # time spent waiting for a free slot (or opening a new connection) on checkout
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_stats.record_wait(time.perf_counter() - start)
+
+SQLITE_PRAGMAS = (
+    # readers no longer block the writer and vice versa
+    "PRAGMA journal_mode=WAL",
+    # durable at checkpoints only; safe against corruption with WAL
+    "PRAGMA synchronous=NORMAL",
+    # wait for the write lock instead of failing with 'database is locked'
+    f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+)
+
+def sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+def make_engine(url: str, **kwargs):
+    """Async engine for url with the DB_* pool settings applied."""
+    if url.startswith("sqlite"):
+        options = {}
+        if ":memory:" in url or url.rstrip("/").endswith("sqlite+aiosqlite:"):
+            # every connection to :memory: is a separate empty database
+            options["poolclass"] = StaticPool
+        else:
+            options.update(poolclass=TimedQueuePool, pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW,
+                           pool_timeout=POOL_TIMEOUT)
+        options.update(kwargs)
+        engine = create_async_engine(url, **options)
+        event.listen(engine.sync_engine, "connect", sqlite_pragmas)
+    else:
+        connect_args = {}
+        if PGBOUNCER:
+            # transaction pooling hands each transaction a different server
+            # connection, so prepared statements must not outlive one
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_cache_size"] = 0
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+            if STATEMENT_TIMEOUT_MS:
+                # pgbouncer rejects unknown startup parameters; time out client side instead
+                connect_args["command_timeout"] = STATEMENT_TIMEOUT_MS / 1000
+        elif STATEMENT_TIMEOUT_MS:
+            connect_args["server_settings"] = {"statement_timeout": str(STATEMENT_TIMEOUT_MS)}
+        options = dict(
+            poolclass=TimedQueuePool,
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT,
+            pool_recycle=POOL_RECYCLE,
+            pool_pre_ping=POOL_PRE_PING,
+            # reuse the most recent connection so idle extras age out via recycle
+            pool_use_lifo=True,
+            connect_args=connect_args,
+        )
+        options.update(kwargs)
+        engine = create_async_engine(url, **options)
+
+    event.listen(engine.sync_engine, "connect", lambda *args: pool_stats.count("connects"))
+    event.listen(engine.sync_engine, "invalidate", lambda *args: pool_stats.count("invalidations"))
+    return engine
+
+engine = make_engine(sqlite_url)
+
+def read_pool_stats() -> dict:
+    return pool_stats.stats(engine.sync_engine.pool)
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+async def get_session():
+    # rows stay readable after commit without another round-trip
+    async with AsyncSession(engine, expire_on_commit=False) as session:
         yield session
 
 # type alias for dependency injection
-SessionDep = Annotated[Session, Depends(get_session)]
+SessionDep = Annotated[AsyncSession, Depends(get_session)]
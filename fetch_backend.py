@@ -1,20 +1,92 @@
 import os
 import json
+import base64
+import importlib.util
+import threading
+import time
 from datetime import date
-import requests
 import getpass
 from pathlib import Path
 import sys
 
+def lazy_import(name):
+    """The module, executed on first attribute access instead of now."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+# requests (with urllib3) is most of the CLI's import time and nothing needs
+# it before the first network call, which no longer happens before the menu
+requests = lazy_import("requests")
+
 CACHE_DIR = Path.home() / ".cache" / "taskline"
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
 SESSION_FILE = CACHE_DIR / "session"
 
-BASE_URL_USERS = "https://taskline-r31n.onrender.com/users"
-BASE_URL_PERSONAL_TASKS = "https://taskline-r31n.onrender.com/personaltasks"
-BASE_URL_SHARED_TASKS = "https://taskline-r31n.onrender.com/sharedtasks"
-BASE_URL_WORKSPACES = "https://taskline-r31n.onrender.com/workspaces"
+BASE_URL = os.getenv("TASKLINE_URL", "https://taskline-r31n.onrender.com").rstrip("/")
+BASE_URL_USERS = f"{BASE_URL}/users"
+BASE_URL_PERSONAL_TASKS = f"{BASE_URL}/personaltasks"
+BASE_URL_SHARED_TASKS = f"{BASE_URL}/sharedtasks"
+BASE_URL_WORKSPACES = f"{BASE_URL}/workspaces"
+
+#  HTTP client 
+TIMEOUT = (5, 60)  # (connect, read); reads are long to ride out Render cold starts
+
+def new_client():
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    class Client(requests.Session):
+        def request(self, method, url, **kwargs):
+            kwargs.setdefault("timeout", TIMEOUT)
+            return super().request(method, url, **kwargs)
+
+    client = Client()
+    retry = Retry(
+        total=3, connect=3, read=1, backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"HEAD", "GET", "PUT", "DELETE"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+    client.mount("https://", adapter)
+    client.mount("http://", adapter)
+    return client
+
+_client = None
+_client_lock = threading.Lock()  # the first call (which loads requests) may come from several threads
+
+def http(token=None):
+    """Shared keep-alive session carrying the auth header; reuses TCP+TLS connections."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = new_client()
+    if token:
+        _client.headers["Authorization"] = f"Bearer {token}"
+    return _client
+
+# Conditional GET: remember the last payload per URL and revalidate with its ETag
+_etag_cache = {}
+
+def get_json(url, token, params=None):
+    key = (url, tuple(sorted((params or {}).items())))
+    cached = _etag_cache.get(key)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    r = http(token).get(url, params=params, headers=headers)
+    if r.status_code == 304 and cached:
+        return 200, cached[1]
+    payload = r.json()
+    if r.status_code == 200 and "ETag" in r.headers:
+        _etag_cache[key] = (r.headers["ETag"], payload)
+    return r.status_code, payload
 
 #  Session Management 
 def save_session(token, user):
@@ -32,7 +104,7 @@ def register_user():
     print("\n=== Register ===")
     name = input("Username: ").strip()
     password = getpass.getpass("Password: ")
-    r = requests.post(f"{BASE_URL_USERS}/register/", json={"name": name, "password": password})
+    r = http().post(f"{BASE_URL_USERS}/register/", json={"name": name, "password": password})
     print("Success!" if r.status_code == 200 else "Error: "+str(r.json()))
     input("Press Enter to continue...")
 
@@ -40,11 +112,10 @@ def login_user():
     print("\n=== Login ===")
     name = input("Username: ").strip()
     password = getpass.getpass("Password: ")
-    r = requests.post(f"{BASE_URL_USERS}/login/", json={"name": name, "password": password})
+    r = http().post(f"{BASE_URL_USERS}/login/", json={"name": name, "password": password})
     if r.status_code == 200:
         token_data = r.json()
-        headers = {"Authorization": f"Bearer {token_data['access_token']}"}
-        v = requests.get(f"{BASE_URL_USERS}/verify", headers=headers)
+        v = http(token_data['access_token']).get(f"{BASE_URL_USERS}/verify")
         if v.status_code == 200:
             user = v.json()
             save_session(token_data['access_token'], user)
@@ -60,7 +131,7 @@ def login_user():
 
 def login_or_register():
     while True:
-        os.system('cls' if os.name == 'nt' else 'clear')
+        print("\033[H\033[2J", end="")  # clear the screen without spawning a shell
         print("\033[0GWelcome to Task Line CLI!\n")  # \033[0G moves cursor to column 0
         print("\033[0G1. Login")
         print("\033[0G2. Register")
@@ -75,63 +146,122 @@ def login_or_register():
         elif choice.lower() == "q":
             sys.exit()
 
+def token_expired(token):
+    """Checks the exp claim locally; whether the token is genuine is for the server to say."""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (IndexError, ValueError):
+        return True
+    return "exp" in claims and claims["exp"] <= time.time()
+
 def load_session():
+    """The cached session, without a round-trip; the CLI confirms it with verify_session in the background."""
     if os.path.exists(SESSION_FILE):
         with open(SESSION_FILE, "r") as f:
             r = json.load(f)
-            headers = {"Authorization": f"Bearer {r['token']}"}
-            v = requests.get(f"{BASE_URL_USERS}/verify", headers=headers)
-            if v.status_code == 200:
-                return r
-            else:
-                print("Session expired!")
-                clear_session()
-                user = login_or_register()
-                if user: return user
+        if not token_expired(r['token']):
+            return r
+        print("Session expired!")
+        clear_session()
+        user = login_or_register()
+        if user: return user
                 
     return None
+
+def verify_session(session):
+    """False when the server rejects the token; network errors are raised."""
+    return http(session['token']).get(f"{BASE_URL_USERS}/verify").status_code != 401
     
+# Task listings are keyset-paginated; follow next_cursor until the last page.
+# The server does the ordering and filtering (order_by, status, priority).
+def iter_task_pages(url, token, limit=100, **query):
+    params = {"limit": limit, **{k: v for k, v in query.items() if v is not None}}
+    while True:
+        status_code, page = get_json(url, token, params)
+        if status_code != 200:
+            raise ValueError(page)
+        yield page["tasks"]
+        if not page.get("next_cursor"):
+            return
+        params["cursor"] = page["next_cursor"]
+
+def iter_tasks(url, token, **query):
+    for page in iter_task_pages(url, token, **query):
+        yield from page
+
 # Personal Task APIs 
-def fetch_personal_tasks(user_id, token):
-    headers = {"Authorization": f"Bearer {token}"}
-    r = requests.get(f"{BASE_URL_PERSONAL_TASKS}/{user_id}", headers=headers)
-    tasks = r.json()
+def iter_personal_tasks(user_id, token, **query):
+    return iter_tasks(f"{BASE_URL_PERSONAL_TASKS}/{user_id}", token, **query)
+
+class AccessLost(ValueError):
+    """The list is gone or no longer readable (404/403); retrying cannot help."""
+
+def fetch_task_changes(url, token, since=None, limit=500):
+    """Upserts and deleted ids after version `since` (None for a full snapshot)."""
+    params = {"limit": limit}
+    if since is not None:
+        params["since"] = since
+    r = http(token).get(f"{url}/changes", params=params)
+    changes = r.json()
+    if r.status_code in (403, 404):
+        raise AccessLost(changes)
+    if r.status_code != 200:
+        raise ValueError(changes)
+    return changes
+
+def fetch_personal_changes(user_id, token, since=None):
+    return fetch_task_changes(f"{BASE_URL_PERSONAL_TASKS}/{user_id}", token, since)
+
+def fetch_personal_tasks(user_id, token, **query):
     try:
-      tasks.sort(key=lambda x: x.get("status")=="completed")
-      return tasks
-    except:
-        print(tasks)
+      return list(iter_personal_tasks(user_id, token, **query))
+    except ValueError as e:
+        print(e)
         return
 
 
 def add_personal_task(name, priority, user_id, token):
     today = date.today()
     data = {"name": name, "priority": priority, "date": today.strftime("%b %-d"), "status": "new", "user_id": user_id}
-    headers = {"Authorization": f"Bearer {token}"}
-    requests.post(f"{BASE_URL_PERSONAL_TASKS}/{user_id}", json=data, headers=headers)
+    http(token).post(f"{BASE_URL_PERSONAL_TASKS}/{user_id}", json=data)
 
 def update_personal_task(task_id, name, priority, user_id, token, status=None):
     today = date.today()
     data = {"name": name, "priority": priority, "date": today.strftime("%b %-d"), "user_id": user_id}
     if status: data["status"] = status
-    headers = {"Authorization": f"Bearer {token}"}
-    requests.put(f"{BASE_URL_PERSONAL_TASKS}/{user_id}/{task_id}", json=data, headers=headers)
+    http(token).put(f"{BASE_URL_PERSONAL_TASKS}/{user_id}/{task_id}", json=data)
 
 def delete_personal_task(task_id, user_id, token):
-    headers = {"Authorization": f"Bearer {token}"}
-    requests.delete(f"{BASE_URL_PERSONAL_TASKS}/{user_id}/{task_id}", headers=headers)
+    http(token).delete(f"{BASE_URL_PERSONAL_TASKS}/{user_id}/{task_id}")
 
 def toggle_personal_task(task, user_id, token):
     new_status = "completed" if task["status"]=="new" else "new"
     update_personal_task(task["id"], task["name"], task["priority"], user_id, token, status=new_status)
 
+def batch_personal_tasks(operations, user_id, token):
+    """operations: [{"op": "create"|"update"|"delete"|"toggle", "id": ..., "task": {...}}]
+
+    Returns (status code, body); a 200 body has one result per operation.
+    """
+    r = http(token).post(f"{BASE_URL_PERSONAL_TASKS}/{user_id}/batch", json={"operations": operations})
+    return r.status_code, r.json()
+
+# Search across personal tasks and every accessible workspace
+def search_tasks(query, token, limit=20, cursor=None):
+    params = {"q": query, "limit": limit}
+    if cursor:
+        params["cursor"] = cursor
+    r = http(token).get(f"{BASE_URL}/search/", params=params)
+    if r.status_code != 200:
+        raise ValueError(r.text)
+    return r.json()
+
 # Shared Workspace & Tasks APIs  
 def fetch_workspaces(token):
-    headers = {"Authorization": f"Bearer {token}"}
     try:
-        r = requests.get(f"{BASE_URL_WORKSPACES}/", headers=headers)
-        if r.status_code == 200:
-            data = r.json()
+        status_code, data = get_json(f"{BASE_URL_WORKSPACES}/", token)
+        if status_code == 200:
             if not data:
                 return {}  # Return empty list if no workspaces
             return data
@@ -142,9 +272,8 @@ def fetch_workspaces(token):
 
 
 def create_workspace(name, owner, token):
-    headers = {"Authorization": f"Bearer {token}"}
     data = {"name": name, "owner": owner}
-    r = requests.post("https://taskline-r31n.onrender.com/workspaces/", json=data, headers=headers)
+    r = http(token).post(f"{BASE_URL_WORKSPACES}/", json=data)
     try:
         wid = r.json()  # this returns workspace_id according to your backend
         return wid
@@ -154,16 +283,14 @@ def create_workspace(name, owner, token):
 
 
 def delete_workspace(workspace_id, token):
-    headers = {"Authorization": f"Bearer {token}"}
-    r = requests.delete(f"{BASE_URL_WORKSPACES}/{workspace_id}", headers=headers)
+    r = http(token).delete(f"{BASE_URL_WORKSPACES}/{workspace_id}")
     if r.status_code == 403:
         return "Permission denied (not owner)"
     return "Deleted!"
     
 def add_workspace_member(workspace_id, member_name, token):
-    headers = {"Authorization": f"Bearer {token}"}
     data = {"workspace_id": workspace_id, "member": member_name}
-    r = requests.post(f"https://taskline-r31n.onrender.com/workspaces/{workspace_id}/members", json=data, headers=headers)
+    r = http(token).post(f"{BASE_URL_WORKSPACES}/{workspace_id}/members", json=data)
     if r.status_code == 403:
         return "Permission denied (not owner)"
     if r.status_code == 404:
@@ -171,38 +298,92 @@ def add_workspace_member(workspace_id, member_name, token):
     return "Added successfully!"
 
 def remove_workspace_member(workspace_id, member_name, token):
-    headers = {"Authorization": f"Bearer {token}"}
-    r = requests.delete(f"{BASE_URL_WORKSPACES}/{workspace_id}/members/{member_name}", headers=headers)
+    r = http(token).delete(f"{BASE_URL_WORKSPACES}/{workspace_id}/members/{member_name}")
     if r.status_code == 403:
         return "Permission denied (not owner)"
     if r.status_code == 404:
         return "User not found!"
     return "Removed successfully!"
      
-def fetch_shared_tasks(workspace_id, token):
-    headers = {"Authorization": f"Bearer {token}"}
-    r = requests.get(f"{BASE_URL_SHARED_TASKS}/{workspace_id}", headers=headers)
-    tasks = r.json()
-    tasks.sort(key=lambda x: x.get("status")=="completed")
-    return tasks
+def iter_shared_tasks(workspace_id, token, **query):
+    return iter_tasks(f"{BASE_URL_SHARED_TASKS}/{workspace_id}", token, **query)
+
+def fetch_shared_changes(workspace_id, token, since=None):
+    return fetch_task_changes(f"{BASE_URL_SHARED_TASKS}/{workspace_id}", token, since)
+
+def iter_shared_events(workspace_id, token):
+    """Live events for a workspace (Server-Sent Events); yields None on keepalives."""
+    with http(token).get(f"{BASE_URL_SHARED_TASKS}/{workspace_id}/events", stream=True) as r:
+        if r.status_code in (403, 404):
+            raise AccessLost(r.text)
+        if r.status_code != 200:
+            raise ValueError(r.text)
+        data = []
+        for line in r.iter_lines(decode_unicode=True):
+            if line.startswith(":"):
+                yield None
+            elif line.startswith("data:"):
+                data.append(line[5:].strip())
+            elif not line and data:
+                yield json.loads("\n".join(data))
+                data = []
+
+def fetch_shared_tasks(workspace_id, token, **query):
+    return list(iter_shared_tasks(workspace_id, token, **query))
 
 def add_shared_task(name, priority, workspace_id, token):
     today = date.today()
     data = {"name": name, "priority": priority, "date": today.strftime("%b %-d"), "status":"new", "workspace_id": workspace_id}
-    headers = {"Authorization": f"Bearer {token}"}
-    requests.post(f"{BASE_URL_SHARED_TASKS}/{workspace_id}", json=data, headers=headers)
+    http(token).post(f"{BASE_URL_SHARED_TASKS}/{workspace_id}", json=data)
 
 def update_shared_task(task_id, name, priority, workspace_id, token, status=None):
     today = date.today()
     data = {"name": name, "priority": priority, "date": today.strftime("%b %-d")}
     if status: data["status"] = status
-    headers = {"Authorization": f"Bearer {token}"}
-    requests.put(f"{BASE_URL_SHARED_TASKS}/{workspace_id}/{task_id}", json=data, headers=headers)
+    http(token).put(f"{BASE_URL_SHARED_TASKS}/{workspace_id}/{task_id}", json=data)
 
 def delete_shared_task(task_id, workspace_id, token):
-    headers = {"Authorization": f"Bearer {token}"}
-    requests.delete(f"{BASE_URL_SHARED_TASKS}/{workspace_id}/{task_id}", headers=headers)
+    http(token).delete(f"{BASE_URL_SHARED_TASKS}/{workspace_id}/{task_id}")
 
 def toggle_shared_task(task, workspace_id, token):
     new_status = "completed" if task["status"]=="new" else "new"
     update_shared_task(task["id"], task["name"], task["priority"], workspace_id, token, status=new_status)
+
+def batch_shared_tasks(operations, workspace_id, token):
+    r = http(token).post(f"{BASE_URL_SHARED_TASKS}/{workspace_id}/batch", json={"operations": operations})
+    return r.status_code, r.json()
+
+# Export/import stream between a file and the server, never holding the whole list
+def tasks_url(user_id=None, workspace_id=None):
+    if workspace_id is not None:
+        return f"{BASE_URL_SHARED_TASKS}/{workspace_id}"
+    return f"{BASE_URL_PERSONAL_TASKS}/{user_id}"
+
+def export_tasks(path, fmt, token, user_id=None, workspace_id=None):
+    """Download a task list (jsonl or csv) to path; returns the bytes written."""
+    part = f"{path}.part"  # so a dropped connection does not leave a truncated file behind
+    try:
+        with http(token).get(f"{tasks_url(user_id, workspace_id)}/export", params={"format": fmt}, stream=True) as r:
+            if r.status_code != 200:
+                raise ValueError(r.text)
+            written = 0
+            with open(part, "wb") as f:
+                for chunk in r.iter_content(chunk_size=64 * 1024):
+                    f.write(chunk)
+                    written += len(chunk)
+        os.replace(part, path)
+    finally:
+        if os.path.exists(part):
+            os.remove(part)
+    return written
+
+def import_tasks(path, fmt, token, user_id=None, workspace_id=None):
+    """Upload a jsonl or csv file; returns the server's counts and first errors."""
+    with open(path, "rb") as f:
+        # the file is sent as it is read; the answer only comes once every row is in
+        r = http(token).post(f"{tasks_url(user_id, workspace_id)}/import", params={"format": fmt}, data=f,
+                             timeout=(TIMEOUT[0], None))
+    result = r.json()
+    if r.status_code != 200:
+        raise ValueError(result)
+    return result
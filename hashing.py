@@ -0,0 +1,96 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+from metrics import threadpool_queue_seconds
+
+# Argon2 cost overrides (ARGON2_TIME_COST, ARGON2_MEMORY_COST in KiB,
+# ARGON2_PARALLELISM); unset ones keep passlib's defaults. Changing any of them
+# makes existing hashes "deprecated" and they are rehashed on the user's next
+# successful login.
+ARGON2_SETTINGS = {f"argon2__{name}": int(os.environ[env])
+                   for name, env in (("time_cost", "ARGON2_TIME_COST"), ("memory_cost", "ARGON2_MEMORY_COST"),
+                                     ("parallelism", "ARGON2_PARALLELISM"))
+                   if os.getenv(env)}
+# argon2-cffi releases the GIL, so threads hash in parallel; a pool of our own
+# keeps logins from occupying the threadpool the rest of the API runs on
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", min(4, os.cpu_count() or 1)))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", 64))
+
+pwd_context = CryptContext(schemes=["argon2"], deprecated="auto", **ARGON2_SETTINGS)
+
+class HashingBusy(Exception):
+    pass
+
+class HashPool:
+    """Bounded executor for password hashing with latency and queue metrics."""
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="argon2")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.busy_total = 0.0
+        self.busy_max = 0.0
+        self.wait_total = 0.0
+
+    def _timed(self, submitted, fn, *args):
+        start = time.perf_counter()
+        threadpool_queue_seconds.observe(start - submitted, "argon2")
+        with self._lock:
+            self.running += 1
+            self.wait_total += start - submitted
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.busy_total += elapsed
+                self.busy_max = max(self.busy_max, elapsed)
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HashingBusy()
+            self.pending += 1
+        future = self._executor.submit(self._timed, time.perf_counter(), fn, *args)
+        # released when the job finishes or is cancelled before starting, even if
+        # the request awaiting it went away (client disconnect, timeout)
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future):
+        with self._lock:
+            self.pending -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            done = self.completed
+            return {
+                "workers": self.workers,
+                "running": self.running,
+                "queued": self.pending - self.running,
+                "completed": done,
+                "rejected": self.rejected,
+                "hash_avg_ms": round(self.busy_total / done * 1000, 2) if done else 0.0,
+                "hash_max_ms": round(self.busy_max * 1000, 2),
+                "queue_wait_avg_ms": round(self.wait_total / done * 1000, 2) if done else 0.0,
+            }
+
+hash_pool = HashPool(HASH_WORKERS, HASH_MAX_PENDING)
+
+async def hash_password(password: str) -> str:
+    return await hash_pool.run(pwd_context.hash, password)
+
+async def verify_password(password: str, hashed: str):
+    """(ok, new_hash); new_hash is set when the stored hash uses outdated parameters."""
+    return await hash_pool.run(pwd_context.verify_and_update, password, hashed)
@@ -0,0 +1,468 @@
+import json
+import sqlite3
+import threading
+from datetime import date
+from fetch_backend import (requests, CACHE_DIR, BASE_URL_WORKSPACES, AccessLost, get_json, fetch_personal_changes,
+                           fetch_shared_changes, batch_personal_tasks, batch_shared_tasks, iter_shared_events)
+
+PERSONAL = "personal"
+SHARED = "shared"
+SYNC_INTERVAL = 30  # seconds between background refreshes of watched lists
+MAX_BATCH = 500
+
+def store_file(user_id):
+    # one file per user, so unsynced edits can wait on disk for that user's next login
+    return CACHE_DIR / f"store-{user_id}.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    scope TEXT NOT NULL,
+    scope_id INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    data TEXT NOT NULL,
+    pending INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, scope_id, id)
+);
+CREATE INDEX IF NOT EXISTS ix_tasks_order ON tasks (scope, scope_id, status DESC, priority, id);
+CREATE TABLE IF NOT EXISTS workspaces (
+    user TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user, id)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    scope TEXT NOT NULL,
+    scope_id INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (scope, scope_id)
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    scope TEXT NOT NULL,
+    scope_id INTEGER NOT NULL,
+    op TEXT NOT NULL,
+    task_id INTEGER,
+    payload TEXT
+);
+"""
+
+class LocalStore:
+    """On-disk mirror of the user's tasks and workspaces plus an outbox of unsynced mutations.
+
+    Tasks created offline get negative ids until the server assigns one; later
+    edits to such a task are folded into its pending create, or queued under the
+    temporary id while that create is on its way and re-pointed when it is acked.
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.revision = 0  # bumped on every change so the UI knows when to redraw
+        self.sending = set()  # temp ids whose create is in the batch being pushed
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+
+    #  Reads
+    # Lists are read a page at a time in display order (ix_tasks_order), so the UI
+    # never holds more than the rows around the cursor.
+    def count_tasks(self, scope, scope_id):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM tasks WHERE scope=? AND scope_id=?",
+                                     (scope, scope_id)).fetchone()[0]
+
+    def task_page(self, scope, scope_id, offset, limit):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT data, pending FROM tasks WHERE scope=? AND scope_id=? "
+                "ORDER BY status DESC, priority, id LIMIT ? OFFSET ?", (scope, scope_id, limit, offset)).fetchall()
+        return [dict(json.loads(data), pending=bool(pending)) for data, pending in rows]
+
+    def task(self, scope, scope_id, task_id):
+        with self.lock:
+            return self._get(scope, scope_id, task_id)
+
+    def task_position(self, scope, scope_id, task_id):
+        """Index of a task in display order, or None if it is not in the list."""
+        with self.lock:
+            row = self.conn.execute("SELECT status, priority FROM tasks WHERE scope=? AND scope_id=? AND id=?",
+                                    (scope, scope_id, task_id)).fetchone()
+            if row is None:
+                return None
+            status, priority = row
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE scope=? AND scope_id=? AND (status > ? OR status = ? AND "
+                "(priority < ? OR priority = ? AND id < ?))",
+                (scope, scope_id, status, status, priority, priority, task_id)).fetchone()[0]
+
+    def workspaces(self, user):
+        with self.lock:
+            rows = self.conn.execute("SELECT id, data FROM workspaces WHERE user=? ORDER BY id", (user,)).fetchall()
+        return {str(ws_id): json.loads(data) for ws_id, data in rows}
+
+    #  Server changes
+    def synced_version(self, scope, scope_id):
+        """Server version this list is current to, or None if it was never synced."""
+        with self.lock:
+            row = self.conn.execute("SELECT version FROM sync_state WHERE scope=? AND scope_id=?",
+                                    (scope, scope_id)).fetchone()
+        return row[0] if row else None
+
+    def apply_changes(self, scope, scope_id, changes, since):
+        """Apply a page from the changes endpoint; skipped while local changes for the list are unsynced."""
+        with self.lock, self.conn:
+            if self.has_outbox(scope, scope_id):
+                return False
+            if since is None:  # first page of a full snapshot
+                self.conn.execute("DELETE FROM tasks WHERE scope=? AND scope_id=?", (scope, scope_id))
+            self.conn.executemany("DELETE FROM tasks WHERE scope=? AND scope_id=? AND id=?",
+                                  [(scope, scope_id, task_id) for task_id in changes["deletes"]])
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO tasks (scope, scope_id, id, status, priority, data) VALUES (?, ?, ?, ?, ?, ?)",
+                [(scope, scope_id, t["id"], t["status"], t["priority"], json.dumps(t)) for t in changes["upserts"]])
+            self.conn.execute("INSERT OR REPLACE INTO sync_state (scope, scope_id, version) VALUES (?, ?, ?)",
+                              (scope, scope_id, changes["version"]))
+            if changes["upserts"] or changes["deletes"] or since is None:
+                self.revision += 1
+            return True
+
+    def apply_event(self, scope, scope_id, event):
+        """Patch a list from a live event; False if the list is not at the event's base version."""
+        with self.lock:
+            if self.synced_version(scope, scope_id) != event["since"]:
+                return False
+            return self.apply_changes(scope, scope_id, event, event["since"])
+
+    def replace_workspaces(self, user, workspaces):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM workspaces WHERE user=?", (user,))
+            self.conn.executemany(
+                "INSERT INTO workspaces (user, id, data) VALUES (?, ?, ?)",
+                [(user, ws["workspace_id"], json.dumps(ws)) for ws in workspaces.values()])
+            self.revision += 1
+
+    #  Local mutations
+    def _put(self, scope, scope_id, task, pending=1):
+        self.revision += 1
+        self.conn.execute(
+            "INSERT OR REPLACE INTO tasks (scope, scope_id, id, status, priority, data, pending) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (scope, scope_id, task["id"], task["status"], task["priority"], json.dumps(task), pending))
+
+    def _get(self, scope, scope_id, task_id):
+        row = self.conn.execute("SELECT data FROM tasks WHERE scope=? AND scope_id=? AND id=?",
+                                (scope, scope_id, task_id)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _enqueue(self, scope, scope_id, op, task_id, payload=None):
+        self.conn.execute("INSERT INTO outbox (scope, scope_id, op, task_id, payload) VALUES (?, ?, ?, ?, ?)",
+                          (scope, scope_id, op, task_id, json.dumps(payload) if payload is not None else None))
+
+    def add_task(self, scope, scope_id, name, priority, created_by=None):
+        task = {"name": name, "priority": priority, "date": date.today().strftime("%b %-d"), "status": "new"}
+        if scope == PERSONAL:
+            task["user_id"] = scope_id
+        else:
+            task["workspace_id"] = scope_id
+            task["created_by"] = created_by
+        with self.lock, self.conn:
+            # below every temp id still in use, including those of deleted tasks whose
+            # create is still queued: ack() remaps every outbox entry with that id
+            lowest = self.conn.execute("SELECT MIN(id) FROM (SELECT id FROM tasks UNION ALL "
+                                       "SELECT task_id FROM outbox)").fetchone()[0] or 0
+            temp_id = min(lowest, 0) - 1
+            self._enqueue(scope, scope_id, "create", temp_id, task)
+            self._put(scope, scope_id, dict(task, id=temp_id))
+        return temp_id
+
+    def update_task(self, scope, scope_id, task_id, **changes):
+        changes.setdefault("date", date.today().strftime("%b %-d"))
+        with self.lock, self.conn:
+            task = self._get(scope, scope_id, task_id)
+            if task is None:
+                return
+            task.update(changes)
+            self._put(scope, scope_id, task)
+            if task_id < 0 and task_id not in self.sending:
+                # not on the server yet: rewrite the pending create instead; it carries
+                # every earlier edit too
+                payload = {k: v for k, v in task.items() if k not in ("id", "pending")}
+                self.conn.execute("UPDATE outbox SET payload=? WHERE op='create' AND task_id=?",
+                                  (json.dumps(payload), task_id))
+                self.conn.execute("DELETE FROM outbox WHERE op='update' AND task_id=?", (task_id,))
+            else:
+                self._enqueue(scope, scope_id, "update", task_id, changes)
+
+    def toggle_task(self, scope, scope_id, task):
+        new_status = "completed" if task["status"] == "new" else "new"
+        self.update_task(scope, scope_id, task["id"], status=new_status)
+
+    def delete_task(self, scope, scope_id, task_id):
+        with self.lock, self.conn:
+            self.revision += 1
+            self.conn.execute("DELETE FROM tasks WHERE scope=? AND scope_id=? AND id=?", (scope, scope_id, task_id))
+            if task_id < 0 and task_id not in self.sending:
+                self.conn.execute("DELETE FROM outbox WHERE task_id=?", (task_id,))
+            else:
+                self._enqueue(scope, scope_id, "delete", task_id)
+
+    #  Outbox
+    def has_outbox(self, scope, scope_id):
+        return self.conn.execute("SELECT 1 FROM outbox WHERE scope=? AND scope_id=? LIMIT 1",
+                                 (scope, scope_id)).fetchone() is not None
+
+    def outbox_count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def outbox_scopes(self):
+        with self.lock:
+            return self.conn.execute("SELECT DISTINCT scope, scope_id FROM outbox").fetchall()
+
+    def outbox(self, scope, scope_id, limit=MAX_BATCH):
+        """The next batch to push. It stops at an edit still addressed to a temp id,
+        which can only be sent once the ack of its create has given it a real one."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT seq, op, task_id, payload FROM outbox WHERE scope=? AND scope_id=? ORDER BY seq LIMIT ?",
+                (scope, scope_id, limit)).fetchall()
+            entries = []
+            for seq, op, task_id, payload in rows:
+                if op != "create" and task_id < 0:
+                    break
+                entries.append((seq, op, task_id, json.loads(payload) if payload else None))
+            self.sending = {task_id for _, op, task_id, _ in entries if op == "create"}
+        return entries
+
+    def ack(self, scope, scope_id, entries, results):
+        """Drop pushed outbox entries given the server's result for each; returns how many it rejected.
+
+        A created task replaces its temp row and edits queued under the temp id
+        move to the real one; a rejected create takes its temp row and edits along.
+        """
+        rejected = 0
+        with self.lock, self.conn:
+            self.revision += 1
+            self.sending = set()
+            self.conn.executemany("DELETE FROM outbox WHERE seq=?", [(seq,) for seq, *_ in entries])
+            for (_, op, task_id, _), result in zip(entries, results):
+                rejected += not result["ok"]
+                if op != "create":
+                    continue
+                still_here = self._get(scope, scope_id, task_id) is not None  # not deleted while in flight
+                self.conn.execute("DELETE FROM tasks WHERE scope=? AND scope_id=? AND id=?", (scope, scope_id, task_id))
+                if result["ok"]:
+                    self.conn.execute("UPDATE outbox SET task_id=? WHERE task_id=?", (result["task"]["id"], task_id))
+                    if still_here:
+                        self._put(scope, scope_id, result["task"], pending=0)
+                else:
+                    self.conn.execute("DELETE FROM outbox WHERE task_id=?", (task_id,))
+            if rejected:
+                # local rows may still show the refused edits: take a full snapshot on the next pull
+                self.conn.execute("DELETE FROM sync_state WHERE scope=? AND scope_id=?", (scope, scope_id))
+        return rejected
+
+    def drop_list(self, scope, scope_id):
+        """Forget a list's tasks and sync state; queued edits stay for push() to report."""
+        with self.lock, self.conn:
+            self.revision += 1
+            self.conn.execute("DELETE FROM tasks WHERE scope=? AND scope_id=?", (scope, scope_id))
+            self.conn.execute("DELETE FROM sync_state WHERE scope=? AND scope_id=?", (scope, scope_id))
+
+    def clear(self):
+        with self.lock, self.conn:
+            for table in ("tasks", "workspaces", "sync_state", "outbox"):
+                self.conn.execute(f"DELETE FROM {table}")
+
+
+class SyncWorker(threading.Thread):
+    """Pushes the outbox through the batch endpoints and pulls changes for watched lists."""
+
+    def __init__(self, store, token, username, on_notice=None):
+        super().__init__(daemon=True)
+        self.store = store
+        self.token = token
+        self.username = username
+        self.on_notice = on_notice  # called with messages meant for the user
+        self.watched = {("workspaces", 0)}
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.online = True
+        self.listener = None
+
+    def watch(self, scope, scope_id):
+        self.watched.add((scope, scope_id))
+        self.wake.set()
+
+    def notify(self):
+        self.wake.set()
+
+    def subscribe(self, workspace_id):
+        """Follow live updates for the workspace on screen (one at a time)."""
+        self.unsubscribe()
+        self.listener = EventListener(self, workspace_id)
+        self.listener.start()
+
+    def unsubscribe(self):
+        if self.listener is not None:
+            self.listener.stopped.set()
+            self.listener = None
+
+    def forget(self, workspace_id):
+        """Stop following a workspace that was deleted or that the user can no longer see."""
+        if (SHARED, workspace_id) in self.watched and self.on_notice:
+            self.on_notice("Workspace no longer available")
+        self.watched.discard((SHARED, workspace_id))
+        listener = self.listener
+        if listener is not None and listener.workspace_id == workspace_id:
+            self.unsubscribe()
+        self.store.drop_list(SHARED, workspace_id)
+        self.watch("workspaces", 0)
+
+    def stop(self, flush=True):
+        self.unsubscribe()
+        self.stopped.set()
+        self.wake.set()
+        if self.is_alive():
+            self.join(timeout=5)
+        if flush and self.online:
+            self.push()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.sync_once()
+            self.wake.wait(SYNC_INTERVAL)
+            self.wake.clear()
+
+    def sync_once(self):
+        self.push()
+        for scope, scope_id in list(self.watched):
+            self.pull(scope, scope_id)
+
+    def push(self):
+        for scope, scope_id in self.store.outbox_scopes():
+            while entries := self.store.outbox(scope, scope_id):
+                ops = [{"op": op, "id": task_id if op != "create" else None, "task": payload}
+                       for _, op, task_id, payload in entries]
+                batch = batch_personal_tasks if scope == PERSONAL else batch_shared_tasks
+                try:
+                    status_code, body = batch(ops, scope_id, self.token)
+                    if status_code == 200:
+                        results = body["results"]
+                except (requests.RequestException, ValueError, KeyError):
+                    self.online = False
+                    return
+                if status_code == 401:
+                    return  # token expired: keep everything for after the next login
+                if status_code >= 500 or status_code in (408, 429):
+                    self.online = False
+                    return
+                if status_code != 200:
+                    # the whole batch was refused (workspace deleted, access revoked, ...); retrying cannot help
+                    results = [{"ok": False}] * len(entries)
+                self.online = True
+                # items the server rejected are dropped; the next pull restores server state
+                rejected = self.store.ack(scope, scope_id, entries, results)
+                if rejected and self.on_notice:
+                    self.on_notice(f"{rejected} change(s) rejected by the server and dropped")
+            self.pull(scope, scope_id)
+
+    def pull(self, scope, scope_id):
+        try:
+            if scope == "workspaces":
+                status_code, workspaces = get_json(f"{BASE_URL_WORKSPACES}/", self.token)
+                if status_code != 200:
+                    raise ValueError(workspaces)
+                # task counts for the menu; older servers have no summary endpoint
+                status_code, summary = get_json(f"{BASE_URL_WORKSPACES}/summary", self.token)
+                if status_code == 200:
+                    workspaces = {ws_id: {**ws, "counts": summary.get(ws_id)} for ws_id, ws in workspaces.items()}
+                self.store.replace_workspaces(self.username, workspaces)
+            else:
+                fetch = fetch_personal_changes if scope == PERSONAL else fetch_shared_changes
+                since = self.store.synced_version(scope, scope_id)
+                while True:
+                    changes = fetch(scope_id, self.token, since)
+                    if not self.store.apply_changes(scope, scope_id, changes, since):
+                        break
+                    since = changes["version"]
+                    if not changes["more"]:
+                        break
+            self.online = True
+        except AccessLost:
+            # the server answered, so this is not being offline
+            self.online = True
+            if scope == SHARED:
+                self.forget(scope_id)
+        except (requests.RequestException, ValueError, KeyError):
+            self.online = False
+
+
+class EventListener(threading.Thread):
+    """Follows a workspace's live event stream and patches the store in place."""
+
+    def __init__(self, worker, workspace_id):
+        super().__init__(daemon=True)
+        self.worker = worker
+        self.workspace_id = workspace_id
+        self.stopped = threading.Event()
+
+    def run(self):
+        backoff = 1
+        while not self.stopped.is_set():
+            try:
+                for event in iter_shared_events(self.workspace_id, self.worker.token):
+                    backoff = 1
+                    if self.stopped.is_set():
+                        return
+                    if event is not None:
+                        self.handle(event)
+            except AccessLost:
+                self.worker.forget(self.workspace_id)
+                return
+            except (requests.RequestException, ValueError):
+                pass
+            # stream ended or failed: catch up through the changes endpoint, then reconnect
+            self.worker.notify()
+            self.stopped.wait(backoff)
+            backoff = min(backoff * 2, 60)
+
+    def handle(self, event):
+        store = self.worker.store
+        if event["type"] == "changes" and store.apply_event(SHARED, self.workspace_id, event):
+            return
+        if event["type"] == "workspace_deleted":
+            self.worker.forget(self.workspace_id)
+            return
+        self.worker.notify()  # missed an event or had local edits queued: pull instead
+
+
+_local = None
+
+def open_local(session, on_notice=None):
+    """Store and running sync worker for the logged-in session."""
+    global _local
+    if _local is None or _local[1].token != session["token"]:
+        close_local()
+        store = LocalStore(store_file(session["user"]["id"]))
+        worker = SyncWorker(store, session["token"], session["user"]["name"], on_notice)
+        worker.start()
+        _local = (store, worker)
+    return _local
+
+def close_local(wipe=False):
+    """Stop syncing; wipe drops the local copy unless edits could not be pushed.
+
+    Returns the number of changes left unsynced (kept for the user's next login).
+    """
+    global _local
+    if _local is None:
+        return 0
+    store, worker = _local
+    worker.stop(flush=True)
+    unsynced = store.outbox_count()
+    if wipe and not unsynced:
+        store.clear()
+    _local = None
+    return unsynced
@@ -1,21 +1,48 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
+import database
+import hashing
+import metrics
 from database import create_db_and_tables
-from paths import task_manager, user_manager, shared_tasks, workspace_manager
+from migrations import run_migrations
+from paths import access, task_manager, user_manager, shared_tasks, workspace_manager, summary, search
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # create tables before app starts
-    create_db_and_tables()
+    await create_db_and_tables()
+    await run_migrations()
     yield
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument_engine(database.engine)
 
 app.include_router(task_manager.router, prefix="/personaltasks", tags=["tasks"])
 app.include_router(user_manager.router, prefix="/users", tags=["users"])
+app.include_router(summary.router, prefix="/workspaces", tags=["workspaces"])
 app.include_router(workspace_manager.router, prefix="/workspaces", tags=["workspaces"])
 app.include_router(shared_tasks.router, prefix="/sharedtasks", tags=["sharedtasks"])
+app.include_router(search.router, prefix="/search", tags=["search"])
 
 @app.head("/")
 def read_root():
     return {"message": "Welcome to the Task Manager API"}
+
+@app.get("/stats")
+def read_stats():
+    return {"user_cache": user_manager.user_cache.stats(), "db_pool": database.read_pool_stats(),
+            "password_hashing": hashing.hash_pool.stats(), "summary_cache": access.summary_cache.stats(),
+            "membership_cache": access.membership_cache.stats()}
+
+metrics.register_gauges("db_pool", database.read_pool_stats)
+metrics.register_gauges("threadpool", metrics.threadpool_stats)
+metrics.register_gauges("password_hashing", hashing.hash_pool.stats)
+metrics.register_gauges("user_cache", user_manager.user_cache.stats)
+metrics.register_gauges("membership_cache", access.membership_cache.stats)
+metrics.register_gauges("summary_cache", access.summary_cache.stats)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def read_metrics():
+    return metrics.render()
@@ -0,0 +1,80 @@
+"""Database maintenance, run against the same DATABASE_URL / DB_BACKEND as the server.
+
+    python maintenance.py gc [--chunk 1000] [--pause 0.05] [--dry-run]
+
+gc deletes members and shared tasks whose workspace no longer exists (left
+behind by releases that did not cascade workspace deletion). Each chunk is
+its own short transaction, so concurrent writes only ever wait for one chunk.
+On Postgres it then validates the foreign keys the migrations added NOT VALID.
+"""
+import argparse
+import asyncio
+from sqlalchemy import delete, exists, func, select, text
+from sqlmodel import SQLModel
+from database import engine
+from paths import shared_tasks  # noqa: F401 (registers SharedTask)
+from paths.workspace_manager import Workspace, workspace_references
+
+def orphaned(column):
+    return ~exists().where(Workspace.__table__.c.id == column)
+
+async def count_orphans(table, column) -> int:
+    async with engine.connect() as conn:
+        return (await conn.execute(select(func.count()).select_from(table).where(orphaned(column)))).scalar_one()
+
+async def purge_orphans(table, column, chunk: int, pause: float) -> int:
+    deleted, last_id = 0, None
+    while True:
+        async with engine.begin() as conn:
+            # walk the primary key so every chunk starts where the last one stopped
+            stmt = select(table.c.id).where(orphaned(column)).order_by(table.c.id).limit(chunk)
+            if last_id is not None:
+                stmt = stmt.where(table.c.id > last_id)
+            ids = (await conn.execute(stmt)).scalars().all()
+            if not ids:
+                return deleted
+            await conn.execute(delete(table).where(table.c.id.in_(ids)))
+        deleted += len(ids)
+        last_id = ids[-1]
+        print(f"  {table.name}: {deleted} deleted")
+        await asyncio.sleep(pause)
+
+async def validate_foreign_keys():
+    if engine.dialect.name != "postgresql":
+        return
+    tables = [table.name for table in SQLModel.metadata.sorted_tables]
+    async with engine.begin() as conn:
+        pending = (await conn.execute(text(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+            "WHERE contype = 'f' AND NOT convalidated AND conrelid::regclass::text = ANY(:tables)"),
+            {"tables": tables})).all()
+    quote = engine.dialect.identifier_preparer.quote
+    for table, name in pending:
+        # one transaction each: VALIDATE scans the table but does not block writes
+        async with engine.begin() as conn:
+            await conn.execute(text(f"ALTER TABLE {quote(table)} VALIDATE CONSTRAINT {quote(name)}"))
+        print(f"validated {table}.{name}")
+
+async def gc(chunk: int, pause: float, dry_run: bool):
+    for table, column in workspace_references():
+        if dry_run:
+            print(f"{table.name}: {await count_orphans(table, column)} orphaned")
+        else:
+            print(f"{table.name}: {await purge_orphans(table, column, chunk, pause)} orphans removed")
+    if not dry_run:
+        await validate_foreign_keys()
+    await engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    gc_parser = commands.add_parser("gc", help="delete rows that reference deleted workspaces")
+    gc_parser.add_argument("--chunk", type=int, default=1000, help="rows deleted per transaction")
+    gc_parser.add_argument("--pause", type=float, default=0.05, help="seconds to sleep between chunks")
+    gc_parser.add_argument("--dry-run", action="store_true", help="only count orphans")
+    args = parser.parse_args()
+    if args.command == "gc":
+        asyncio.run(gc(args.chunk, args.pause, args.dry_run))
+
+if __name__ == "__main__":
+    main()
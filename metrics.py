@@ -0,0 +1,236 @@
+"""Request metrics in the Prometheus text format, without a client library.
+
+MetricsMiddleware times every request by route template and instrument_engine
+attributes each SQL statement to the request that issued it, so /metrics can
+separate auth, database and the rest of the handler. Per-request numbers are
+also sent back in a Server-Timing header.
+"""
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+import anyio.to_thread
+from sqlalchemy import event
+
+# requests slower than this are logged with their SQL; 0 turns the log off
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+SLOW_REQUEST_MAX_STATEMENTS = int(os.getenv("SLOW_REQUEST_MAX_STATEMENTS", "50"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+slow_log = logging.getLogger("taskline.slow")
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets, labelnames=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        # label values -> per-bucket counts (last one is +Inf), sum, count
+        self._series = {}
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += n
+                    yield f"{self.name}_bucket{_labels(self.labelnames + ('le',), labels + (bound,))} {cumulative}"
+                yield f"{self.name}_sum{_labels(self.labelnames, labels)} {total}"
+                yield f"{self.name}_count{_labels(self.labelnames, labels)} {count}"
+
+request_seconds = Histogram("taskline_http_request_duration_seconds",
+                            "Time until response headers (includes serialization), by route.",
+                            LATENCY_BUCKETS, ("method", "route"))
+requests_total = Counter("taskline_http_requests_total", "Requests by route and status.", ("method", "route", "status"))
+request_queries = Histogram("taskline_http_request_db_queries", "SQL statements per request.",
+                            QUERY_COUNT_BUCKETS, ("method", "route"))
+request_db_seconds = Histogram("taskline_http_request_db_seconds", "Time spent in SQL per request.",
+                               LATENCY_BUCKETS, ("method", "route"))
+query_seconds = Histogram("taskline_db_query_duration_seconds", "Duration of single SQL statements.",
+                          LATENCY_BUCKETS, ("statement",))
+phase_seconds = Histogram("taskline_phase_duration_seconds", "Time spent in instrumented phases (see metrics.timed).",
+                          LATENCY_BUCKETS, ("phase",))
+threadpool_queue_seconds = Histogram("taskline_threadpool_queue_seconds", "Time work waited for a pool thread.",
+                                     LATENCY_BUCKETS, ("pool",))
+slow_requests_total = Counter("taskline_slow_requests_total", "Requests over SLOW_REQUEST_MS.", ("method", "route"))
+
+METRICS = [request_seconds, requests_total, request_queries, request_db_seconds, query_seconds,
+           phase_seconds, threadpool_queue_seconds, slow_requests_total]
+_gauges = {}
+
+def register_gauges(prefix: str, read):
+    """Expose the numeric values of the dict returned by read() as taskline_<prefix>_<key>."""
+    _gauges[prefix] = read
+
+def threadpool_stats() -> dict:
+    # the threadpool sync endpoints and dependencies run on; must be read on the event loop
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    stats = limiter.statistics()
+    return {"threads_total": limiter.total_tokens, "threads_busy": stats.borrowed_tokens, "waiting": stats.tasks_waiting}
+
+def render() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for prefix, read in _gauges.items():
+        for key, value in read().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                name = f"taskline_{prefix}_{key}"
+                lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "phases", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.phases = {}
+        self.statements = [] if SLOW_REQUEST_MS else None
+
+current_request = contextvars.ContextVar("taskline_request_stats", default=None)
+
+@contextmanager
+def timed(phase: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        phase_seconds.observe(elapsed, phase)
+        stats = current_request.get()
+        if stats is not None:
+            stats.phases[phase] = stats.phases.get(phase, 0.0) + elapsed
+
+def statement_kind(statement: str) -> str:
+    kind = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return kind if kind in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+def instrument_engine(engine):
+    """Time every statement and charge it to the request it runs for."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_start
+        query_seconds.observe(elapsed, statement_kind(statement))
+        # the async engine runs this in a greenlet that shares the request's context
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+            if stats.statements is not None and len(stats.statements) < SLOW_REQUEST_MAX_STATEMENTS:
+                stats.statements.append((elapsed, statement))
+
+def route_label(scope) -> str:
+    """The matched route's template, e.g. /personaltasks/{user_id}, so ids do not explode the label set.
+
+    Routers added with a prefix match with their own path_format; the prefix is
+    the part of the path in front of what that template matched.
+    """
+    route = scope.get("route")
+    path_format = getattr(route, "path_format", None)
+    if path_format is None:
+        return "unmatched"
+    path = scope["path"]
+    for i, char in enumerate(path):
+        if char == "/" and route.path_regex.match(path[i:]):
+            return path[:i] + path_format
+    return path_format
+
+def server_timing(stats: RequestStats, elapsed: float) -> bytes:
+    parts = [f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.queries} queries"']
+    parts += [f"{phase};dur={seconds * 1000:.2f}" for phase, seconds in stats.phases.items()]
+    parts.append(f"app;dur={elapsed * 1000:.2f}")
+    return ", ".join(parts).encode()
+
+class MetricsMiddleware:
+    """Plain ASGI middleware; latency is measured to the response headers, so
+    streaming responses (SSE) count their setup, not the life of the stream."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        response = {"status": 500, "elapsed": None}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - start
+                response.update(status=message["status"], elapsed=elapsed)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", server_timing(stats, elapsed))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            elapsed = response["elapsed"] if response["elapsed"] is not None else time.perf_counter() - start
+            self.record(scope, stats, response["status"], elapsed)
+
+    def record(self, scope, stats: RequestStats, status: int, elapsed: float):
+        method, route = scope["method"], route_label(scope)
+        request_seconds.observe(elapsed, method, route)
+        requests_total.inc(method, route, status)
+        request_queries.observe(stats.queries, method, route)
+        request_db_seconds.observe(stats.db_seconds, method, route)
+        if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+            slow_requests_total.inc(method, route)
+            statements = "".join(f"\n  {seconds * 1000:8.2f} ms  {' '.join(statement.split())}"
+                                 for seconds, statement in stats.statements)
+            slow_log.warning("slow request %s %s -> %s in %.1f ms, %d queries / %.1f ms in SQL%s",
+                             method, scope["path"], status, elapsed * 1000, stats.queries,
+                             stats.db_seconds * 1000, statements)
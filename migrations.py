@@ -0,0 +1,132 @@
+from datetime import datetime, timezone
+from sqlalchemy import bindparam, inspect, select, text
+from sqlalchemy.schema import CreateIndex
+from sqlmodel import SQLModel
+from database import engine
+from paths.versions import utcnow
+
+# create_all only creates missing tables; these steps bring tables created by
+# an older release up to the current models.
+
+def add_missing_columns(conn):
+    inspector = inspect(conn)
+    quote = conn.dialect.identifier_preparer.quote
+    for table in SQLModel.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column.type.compile(conn.dialect)}"
+            if column.server_default is not None:
+                default = column.server_default.arg
+                ddl += f" DEFAULT {getattr(default, 'text', default)}"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+            conn.execute(text(ddl))
+
+def create_missing_indexes(conn):
+    # IF NOT EXISTS rather than checkfirst: SQLite does not reflect expression indexes
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+
+def add_foreign_keys(conn):
+    """Foreign keys missing from existing tables, Postgres only (SQLite cannot add them in place).
+
+    Added NOT VALID so existing orphans do not block startup and no table scan
+    happens here; `python maintenance.py gc` removes the orphans and validates.
+    """
+    if conn.dialect.name != "postgresql":
+        return
+    inspector = inspect(conn)
+    quote = conn.dialect.identifier_preparer.quote
+    for table in SQLModel.metadata.sorted_tables:
+        existing = {(tuple(fk["constrained_columns"]), fk["referred_table"]) for fk in inspector.get_foreign_keys(table.name)}
+        for constraint in table.foreign_key_constraints:
+            columns = [element.parent.name for element in constraint.elements]
+            referred = constraint.referred_table
+            if (tuple(columns), referred.name) in existing:
+                continue
+            name = f"fk_{table.name}_{'_'.join(columns)}"
+            ddl = (f"ALTER TABLE {quote(table.name)} ADD CONSTRAINT {quote(name)} "
+                   f"FOREIGN KEY ({', '.join(map(quote, columns))}) REFERENCES {quote(referred.name)} "
+                   f"({', '.join(quote(element.column.name) for element in constraint.elements)})")
+            if constraint.ondelete:
+                ddl += f" ON DELETE {constraint.ondelete}"
+            conn.execute(text(ddl + " NOT VALID"))
+
+# indexes replaced by a wider one in the models; the new one is created first
+SUPERSEDED_INDEXES = {
+    "task": ["ix_task_user_status_priority", "ix_task_user_due"],
+    "sharedtask": ["ix_sharedtask_workspace_status_priority", "ix_sharedtask_workspace_due"],
+}
+
+def drop_superseded_indexes(conn):
+    quote = conn.dialect.identifier_preparer.quote
+    for names in SUPERSEDED_INDEXES.values():
+        for name in names:
+            conn.execute(text(f"DROP INDEX IF EXISTS {quote(name)}"))
+
+def backfill_task_versions(conn):
+    # rows written before per-row versions existed get unique versions below
+    # every real one, so delta sync can page through them like any other row
+    for table in ("task", "sharedtask"):
+        conn.execute(text(f"UPDATE {table} SET version = -id WHERE version = 0"))
+
+def parse_task_date(value, now: datetime) -> datetime:
+    """'Oct 18' as written by the CLI, in the latest year that is not in the future."""
+    try:
+        parsed = datetime.strptime(f"{value} {now.year}", "%b %d %Y").replace(tzinfo=timezone.utc)
+        return parsed if parsed <= now else parsed.replace(year=now.year - 1)
+    except (TypeError, ValueError):
+        return now
+
+def backfill_task_timestamps(conn):
+    # the display date is the best record of when older rows were written
+    now = utcnow()
+    for name in ("task", "sharedtask"):
+        table = SQLModel.metadata.tables[name]
+        rows = conn.execute(select(table.c.id, table.c.date).where(table.c.created_at.is_(None))).all()
+        if rows:
+            stmt = (table.update().where(table.c.id == bindparam("row_id"))
+                    .values(created_at=bindparam("ts"), updated_at=bindparam("ts")))
+            conn.execute(stmt, [{"row_id": row_id, "ts": parse_task_date(value, now)} for row_id, value in rows])
+
+SEARCHED_TABLES = ("task", "sharedtask")
+
+def create_search_indexes(conn):
+    """Trigram indexes on task names for GET /search."""
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for table in SEARCHED_TABLES:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_name_trgm ON {table} USING gin (name gin_trgm_ops)"))
+    elif conn.dialect.name == "sqlite":
+        inspector = inspect(conn)
+        for table in SEARCHED_TABLES:
+            fts = f"{table}_fts"
+            if inspector.has_table(fts):
+                continue
+            # external-content FTS5 table kept in step with the task table by triggers
+            conn.execute(text(f"CREATE VIRTUAL TABLE {fts} USING fts5(name, content='{table}', content_rowid='id', tokenize='trigram')"))
+            conn.execute(text(f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+                              f"INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name); END"))
+            conn.execute(text(f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+                              f"INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name); END"))
+            conn.execute(text(f"CREATE TRIGGER {fts}_au AFTER UPDATE OF name ON {table} BEGIN "
+                              f"INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name); "
+                              f"INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name); END"))
+            conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+def migrate(conn):
+    add_missing_columns(conn)
+    create_missing_indexes(conn)
+    drop_superseded_indexes(conn)
+    add_foreign_keys(conn)
+    backfill_task_versions(conn)
+    backfill_task_timestamps(conn)
+    create_search_indexes(conn)
+
+async def run_migrations():
+    async with engine.begin() as conn:
+        # inspection and DDL are sync APIs; run them on the async connection's sync facade
+        await conn.run_sync(migrate)
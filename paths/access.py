@@ -0,0 +1,23 @@
+from cache import TTLCache
+import os
+
+# Caches consulted on every shared-task request. They hold no models so that
+# workspace_manager (which invalidates them) and shared_tasks (which reads
+# them) can both import this module. Invalidation only reaches this process;
+# with several workers the TTLs bound how long others serve stale entries.
+
+# username -> frozenset of workspace ids the user owns or belongs to
+membership_cache = TTLCache(
+    maxsize=int(os.getenv("MEMBERSHIP_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("MEMBERSHIP_CACHE_TTL", "60")),
+)
+
+# workspace_id -> task counts for GET /workspaces/summary
+summary_cache = TTLCache(
+    maxsize=int(os.getenv("SUMMARY_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("SUMMARY_CACHE_TTL", "30")),
+)
+
+def invalidate_memberships(*usernames: str):
+    for name in usernames:
+        membership_cache.invalidate(name)
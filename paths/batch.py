@@ -0,0 +1,92 @@
+from typing import List, Literal
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlmodel import select, SQLModel, Field
+from sqlalchemy.exc import IntegrityError
+from .versions import stamp_versions
+
+MAX_BATCH = 500
+
+class BatchOperation(SQLModel):
+    op: Literal["create", "update", "delete", "toggle"]
+    id: int | None = None
+    task: dict | None = None
+
+class BatchRequest(SQLModel):
+    operations: List[BatchOperation] = Field(max_length=MAX_BATCH)
+
+class BatchItemResult(SQLModel):
+    index: int
+    op: str
+    ok: bool
+    id: int | None = None
+    task: dict | None = None
+    error: str | None = None
+
+class BatchResponse(SQLModel):
+    results: List[BatchItemResult]
+
+def validation_message(e: ValidationError) -> str:
+    """One "field: reason" per error, without the input echo and docs link of str(e)."""
+    return "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+
+async def apply_batch(session, operations: List[BatchOperation], table, base, update, in_scope, defaults: dict, version_key: str,
+                on_commit=None):
+    """Apply create/update/delete/toggle operations in a single transaction.
+
+    Invalid items are reported in their result and skipped; the rest are
+    committed together. on_commit(versions, upserts, deletes) runs afterwards.
+    """
+    ids = {item.id for item in operations if item.op != "create" and item.id is not None}
+    rows = {}
+    if ids:
+        rows = {row.id: row for row in await session.exec(select(table).where(table.id.in_(ids)))}
+
+    results, deleted = [], []
+    for index, item in enumerate(operations):
+        result = BatchItemResult(index=index, op=item.op, ok=True, id=item.id)
+        results.append((result, None))
+        try:
+            if item.op == "create":
+                row = table.model_validate(base.model_validate({**(item.task or {}), **defaults}))
+                session.add(row)
+                results[-1] = (result, row)
+                continue
+            row = rows.get(item.id)
+            if row is None or not in_scope(row):
+                raise LookupError("Task not found")
+            if item.op == "delete":
+                await session.delete(row)
+                rows.pop(item.id)
+                deleted.append(item.id)
+                continue
+            if item.op == "update":
+                row.sqlmodel_update(update.model_validate(item.task or {}).model_dump(exclude_unset=True))
+            else:
+                row.status = "completed" if row.status == "new" else "new"
+            session.add(row)
+            results[-1] = (result, row)
+        except ValidationError as e:
+            result.ok = False
+            result.error = validation_message(e)
+        except LookupError as e:
+            result.ok = False
+            result.error = str(e)
+
+    written = {id(row): row for _, row in results if row is not None and row.id not in deleted}
+    versions = await stamp_versions(session, version_key, rows=list(written.values()), deleted_ids=deleted)
+    try:
+        await session.flush()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=409, detail="Batch rejected by the database")
+    # serialise before commit expires the rows
+    for result, row in results:
+        if row is not None:
+            result.id = row.id
+            result.task = row.model_dump()
+    await session.commit()
+    if on_commit and versions:
+        upserts = {row_result.id: row_result.task for row_result, row in results if id(row) in written}
+        on_commit(versions, list(upserts.values()), deleted)
+    return BatchResponse(results=[result for result, _ in results])
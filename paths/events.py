@@ -0,0 +1,67 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+KEEPALIVE = 15  # seconds between SSE comments so proxies keep the stream open
+QUEUE_SIZE = 100
+
+class Broker:
+    """In-process fan-out of events to the SSE subscribers of a channel.
+
+    publish() may be called from threadpool workers; delivery hops onto each
+    subscriber's event loop. Subscribers only see events published by the same
+    server process.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[channel].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, channel: str, queue: asyncio.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(channel, set())
+            subscribers.difference_update({s for s in subscribers if s[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(channel, None)
+
+    def publish(self, channel: str, event: dict):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_deliver, queue, event)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+def _deliver(queue: asyncio.Queue, event: dict):
+    if queue.full():
+        # slow consumer: drop the backlog and tell it to resync instead
+        while not queue.empty():
+            queue.get_nowait()
+        event = {"type": "resync"}
+    queue.put_nowait(event)
+
+broker = Broker()
+
+async def event_stream(channel: str):
+    """Server-Sent Events for one channel until the client disconnects."""
+    queue = broker.subscribe(channel)
+    try:
+        yield ": connected\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        broker.unsubscribe(channel, queue)
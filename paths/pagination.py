@@ -0,0 +1,78 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import DateTime, and_, or_
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression
+
+# A keyset is a list of (column, descending) pairs; the last column must be unique (the id).
+# A nullable column sorts nulls last by preceding it with nulls_last(column).
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":"), default=datetime.isoformat).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _is_datetime(column) -> bool:
+    # sqlmodel wraps DateTime in a TypeDecorator
+    return isinstance(getattr(column.type, "impl", column.type), DateTime)
+
+def decode_cursor(cursor: str, keyset) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(keyset):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        if any(_is_null_flag(column) and not isinstance(value, bool) for (column, _), value in zip(keyset, values)):
+            raise ValueError
+        # datetimes travel as ISO strings
+        return [datetime.fromisoformat(value) if value is not None and _is_datetime(column) else value
+                for (column, _), value in zip(keyset, values)]
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def nulls_last(column):
+    return (column.is_(None), False)
+
+def _is_null_flag(column) -> bool:
+    return isinstance(column, BinaryExpression) and column.operator is operators.is_
+
+def _cursor_value(row, column):
+    if _is_null_flag(column):
+        return getattr(row, column.left.key) is None
+    return getattr(row, column.key)
+
+def keyset_order(keyset):
+    return [column.desc() if descending else column.asc() for column, descending in keyset]
+
+def keyset_after(keyset, values):
+    """WHERE clause selecting the rows that sort strictly after `values`."""
+    clauses = []
+    for i, (column, descending) in enumerate(keyset):
+        value = values[i]
+        if value is None or (_is_null_flag(column) and value):
+            continue  # behind nulls_last, a null is the end of its column
+        equal = [keyset[j][0] == values[j] for j in range(i)]
+        if _is_null_flag(column):
+            beyond = column
+        else:
+            beyond = column < value if descending else column > value
+        clauses.append(and_(*equal, beyond))
+    return or_(*clauses)
+
+def keyset_page(stmt, keyset, cursor: str | None, limit: int):
+    """Apply cursor, ordering and limit (+1 to detect a following page) to stmt."""
+    if cursor:
+        stmt = stmt.where(keyset_after(keyset, decode_cursor(cursor, keyset)))
+    return stmt.order_by(*keyset_order(keyset)).limit(limit + 1)
+
+def next_cursor(rows: list, keyset, limit: int) -> str | None:
+    """Trim the lookahead row and return the cursor for the following page."""
+    if len(rows) <= limit:
+        return None
+    del rows[limit:]
+    last = rows[-1]
+    return encode_cursor([_cursor_value(last, column) for column, _ in keyset])
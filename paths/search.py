@@ -0,0 +1,108 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Annotated, List, Literal
+from sqlmodel import select, SQLModel
+from sqlalchemy import column, func, literal, literal_column, table as sql_table
+from database import SessionDep
+from .user_manager import get_current_user, oauth2_scheme
+from .task_manager import Task
+from .shared_tasks import SharedTask
+from .workspace_manager import Workspace, accessible_workspace_ids
+from .pagination import decode_cursor, encode_cursor, keyset_after
+
+router = APIRouter()
+
+# Task names are indexed by trigrams (pg_trgm on Postgres, an FTS5 trigram
+# table on SQLite, see migrations.create_search_indexes); shorter queries
+# cannot use the index and fall back to a scan of the user's own rows.
+MIN_INDEXED_QUERY = 3
+# hits are ordered by score, then personal before shared, then newest first;
+# the cursor is the (score, scope, id) of the last hit on the page
+SEARCH_KEYSET = [(column("score"), True), (column("scope"), False), (column("id"), True)]
+
+class SearchHit(SQLModel):
+    scope: Literal["personal", "shared"]
+    id: int
+    name: str
+    priority: str
+    status: str
+    date: str
+    workspace_id: int | None = None
+    workspace_name: str | None = None
+    score: float
+
+class SearchPage(SQLModel):
+    hits: List[SearchHit]
+    next_cursor: str | None = None
+
+def escape_like(q: str) -> str:
+    return q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def fts_phrase(q: str) -> str:
+    return '"' + q.replace('"', '""') + '"'
+
+def ranked(dialect: str, table, q: str):
+    """(select(table, score), score) limited to rows whose name contains q; higher score is better."""
+    if dialect == "sqlite" and len(q) >= MIN_INDEXED_QUERY:
+        fts_name = f"{table.__tablename__}_fts"
+        fts = sql_table(fts_name, column("rowid"))
+        matches = (
+            select(fts.c.rowid.label("id"), (-func.bm25(literal_column(fts_name))).label("score"))
+            .where(literal_column(fts_name).op("MATCH")(fts_phrase(q)))
+            .subquery()
+        )
+        return select(table, matches.c.score).join(matches, matches.c.id == table.id), matches.c.score
+    if dialect == "postgresql":
+        score = func.word_similarity(q, table.name)
+    else:
+        score = literal(0.0)
+    stmt = select(table, score.label("score")).where(table.name.ilike(f"%{escape_like(q)}%", escape="\\"))
+    return stmt, score
+
+def decode_search_cursor(cursor: str) -> list:
+    score, scope, task_id = decode_cursor(cursor, SEARCH_KEYSET)
+    if (not isinstance(score, (int, float)) or isinstance(score, bool) or scope not in ("personal", "shared")
+            or not isinstance(task_id, int) or isinstance(task_id, bool)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return [score, scope, task_id]
+
+def after(stmt, score, scope: str, table, last):
+    """stmt limited to the hits of one scope that sort after the last hit of the previous page."""
+    if last is None:
+        return stmt
+    return stmt.where(keyset_after([(score, True), (literal(scope), False), (table.id, True)], last))
+
+@router.get("/", response_model=SearchPage)
+async def search_tasks(q: Annotated[str, Query(min_length=1, max_length=100)],
+    session: SessionDep, token: Annotated[str, Depends(oauth2_scheme)],
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=50)] = 20,
+):
+    current_user = await get_current_user(session, token)
+    last = decode_search_cursor(cursor) if cursor else None
+    dialect = session.bind.dialect.name
+    q = q.strip()
+
+    stmt, score = ranked(dialect, Task, q)
+    stmt = after(stmt.where(Task.user_id == current_user.id), score, "personal", Task, last)
+    stmt = stmt.order_by(score.desc(), Task.id.desc()).limit(limit + 1)
+    hits = [SearchHit(scope="personal", score=row_score, **task.model_dump(include=set(SearchHit.model_fields)))
+            for task, row_score in await session.exec(stmt)]
+
+    stmt, score = ranked(dialect, SharedTask, q)
+    stmt = (
+        after(stmt, score, "shared", SharedTask, last)
+        .add_columns(Workspace.name)
+        .join(Workspace, Workspace.id == SharedTask.workspace_id)
+        .where(SharedTask.workspace_id.in_(accessible_workspace_ids(current_user.name)))
+        .order_by(score.desc(), SharedTask.id.desc())
+        .limit(limit + 1)
+    )
+    hits += [SearchHit(scope="shared", score=row_score, workspace_name=workspace_name,
+                       **task.model_dump(include=set(SearchHit.model_fields)))
+             for task, row_score, workspace_name in await session.exec(stmt)]
+
+    hits.sort(key=lambda hit: (-hit.score, hit.scope, -hit.id))
+    if len(hits) <= limit:
+        return SearchPage(hits=hits)
+    del hits[limit:]
+    return SearchPage(hits=hits, next_cursor=encode_cursor([hits[-1].score, hits[-1].scope, hits[-1].id]))
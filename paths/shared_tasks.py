@@ -1,8 +1,19 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
-from typing import Annotated, List
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Annotated, List, Literal
 from sqlmodel import select, SQLModel, Field
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import Index, text
+import database
 from database import SessionDep
 from .user_manager import get_current_user, oauth2_scheme
+from .workspace_manager import WorkspaceMember, check_member
+from .access import summary_cache
+from .pagination import keyset_page, next_cursor, nulls_last
+from .batch import BatchRequest, BatchResponse, apply_batch
+from .transfer import MEDIA_TYPES, Format, ImportResult, export_rows, import_rows
+from .versions import collection_validators, is_not_modified, read_changes, shared_key, stamp_versions, utcnow, UTCDatetime
+from .events import broker, event_stream
 
 router = APIRouter()
 
@@ -12,56 +23,168 @@ class SharedTaskbase(SQLModel):
     date: str = Field(index=True)
     status: str = Field(default="new")
     created_by: str | None = None
-    workspace_id: int = Field(index=True)
+    workspace_id: int = Field(index=True, foreign_key="workspace.id", ondelete="CASCADE")
+    due_at: UTCDatetime | None = None
 
 class SharedTask(SharedTaskbase, table=True):
+    __table_args__ = (
+        Index("ix_sharedtask_workspace_version", "workspace_id", "version"),
+        # matches SHARED_TASK_KEYSET, so status-ordered pages are read straight off the index
+        Index("ix_sharedtask_workspace_order", "workspace_id", text("status DESC"), "priority", "id"),
+        Index("ix_sharedtask_workspace_updated", "workspace_id", "updated_at"),
+        Index("ix_sharedtask_workspace_due_order", "workspace_id", text("(due_at IS NULL)"), "due_at", "id"),
+    )
     id: int | None = Field(default=None, primary_key=True)
+    version: int = Field(default=0, index=True, sa_column_kwargs={"server_default": "0"})
+    created_at: UTCDatetime | None = Field(default_factory=utcnow)
+    updated_at: UTCDatetime | None = Field(default_factory=utcnow)
 
 class SharedTaskPublic(SharedTaskbase):
     id: int
+    version: int = 0
+    created_at: UTCDatetime | None = None
+    updated_at: UTCDatetime | None = None
+
+class SharedTaskPage(SQLModel):
+    tasks: List[SharedTaskPublic]
+    next_cursor: str | None = None
+
+class SharedTaskChanges(SQLModel):
+    upserts: List[SharedTaskPublic]
+    deletes: List[int]
+    version: int
+    more: bool
 
 class SharedTaskUpdate(SQLModel):
     name: str | None = None
     priority: str | None = None
     date: str | None = None
     status: str | None = None
+    due_at: UTCDatetime | None = None
+
+SHARED_TASK_KEYSET = [(SharedTask.status, True), (SharedTask.priority, False), (SharedTask.id, False)]
+SHARED_TASK_ORDERINGS = {
+    "status": SHARED_TASK_KEYSET,
+    "created": [(SharedTask.id, True)],
+    "updated": [(SharedTask.updated_at, True), (SharedTask.id, True)],
+    "due": [nulls_last(SharedTask.due_at), (SharedTask.due_at, False), (SharedTask.id, False)],
+}
+EXPORT_FIELDS = ["id", "name", "priority", "date", "status", "created_by", "due_at", "created_at", "updated_at"]
+
+def publish_changes(workspace_id: int, versions, upserts=(), deletes=()):
+    summary_cache.invalidate(workspace_id)
+    # same shape (and encoding) as GET /changes, plus the version the change applies on top of
+    if versions:
+        since, version = versions
+        upserts = [SharedTaskPublic.model_validate(task).model_dump(mode="json") for task in upserts]
+        broker.publish(shared_key(workspace_id), {"type": "changes", "since": since, "version": version,
+                                                  "upserts": upserts, "deletes": list(deletes)})
     
 @router.post("/{workspace_id}", response_model=SharedTaskPublic)
-def create_task(task: SharedTaskbase, token: Annotated[str, Depends(oauth2_scheme)], session: SessionDep):
-    current_user = get_current_user(session,token)
+async def create_task(workspace_id: int, task: SharedTaskbase, current_user: WorkspaceMember, session: SessionDep):
+    task.workspace_id = workspace_id
     task.created_by = current_user.name
     db_task = SharedTask.model_validate(task)
-    session.add(db_task)
-    session.commit()
-    session.refresh(db_task)
+    versions = await stamp_versions(session, shared_key(task.workspace_id), rows=[db_task])
+    await session.commit()
+    await session.refresh(db_task)
+    publish_changes(db_task.workspace_id, versions, upserts=[db_task.model_dump()])
     return db_task
 
-@router.get("/{workspace_id}", response_model=List[SharedTaskPublic])
-def read_task(workspace_id,
-    session: SessionDep,
-    offset: int = 0,
-    limit: Annotated[int, Query(le=100)] = 100,
+@router.get("/{workspace_id}", response_model=SharedTaskPage)
+async def read_task(workspace_id: int, request: Request, response: Response,
+    session: SessionDep, current_user: WorkspaceMember,
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 100,
+    order_by: Literal["status", "created", "updated", "due"] = "status",
+    status: str | None = None,
+    priority: str | None = None,
+):
+    validators = await collection_validators(session, shared_key(workspace_id), cursor, limit, order_by, status, priority)
+    if is_not_modified(request, validators):
+        return Response(status_code=304, headers=validators)
+    response.headers.update(validators)
+    stmt = select(SharedTask).where(SharedTask.workspace_id == workspace_id)
+    if status:
+        stmt = stmt.where(SharedTask.status == status)
+    if priority:
+        stmt = stmt.where(SharedTask.priority == priority)
+    keyset = SHARED_TASK_ORDERINGS[order_by]
+    tasks = list((await session.exec(keyset_page(stmt, keyset, cursor, limit))).all())
+    return SharedTaskPage(tasks=tasks, next_cursor=next_cursor(tasks, keyset, limit))
+
+@router.get("/{workspace_id}/changes", response_model=SharedTaskChanges)
+async def read_changes_since(workspace_id: int, session: SessionDep, current_user: WorkspaceMember,
+    since: int | None = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 500,
 ):
-    tasks = list(session.exec(select(SharedTask).where(SharedTask.workspace_id == workspace_id).offset(offset).limit(limit)).all())
-    return tasks
+    upserts, deletes, version, more = await read_changes(session, SharedTask, SharedTask.workspace_id == workspace_id,
+                                                   shared_key(workspace_id), since, limit)
+    return SharedTaskChanges(upserts=upserts, deletes=deletes, version=version, more=more)
+
+@router.get("/{workspace_id}/events")
+async def stream_events(workspace_id: int, token: Annotated[str, Depends(oauth2_scheme)]):
+    # authorize with a short-lived session so the stream does not pin a DB connection
+    async with AsyncSession(database.engine) as session:
+        current_user = await get_current_user(session, token)
+        await check_member(session, workspace_id, current_user.name)
+    return StreamingResponse(event_stream(shared_key(workspace_id)), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @router.delete("/{workspace_id}/{task_id}")
-def delete_task(task_id: int, session: SessionDep):
-    task = session.get(SharedTask, task_id)
-    if not task:
+async def delete_task(workspace_id: int, task_id: int, session: SessionDep, current_user: WorkspaceMember):
+    task = await session.get(SharedTask, task_id)
+    if not task or task.workspace_id != workspace_id:
         raise HTTPException(status_code=404, detail="SharedTask not found")
-    session.delete(task)
-    session.commit()
+    await session.delete(task)
+    versions = await stamp_versions(session, shared_key(workspace_id), deleted_ids=[task_id])
+    await session.commit()
+    publish_changes(workspace_id, versions, deletes=[task_id])
     return {"ok": True}
 
 @router.put("/{workspace_id}/{task_id}", response_model=SharedTaskPublic)
-def update_task(task_id: int, task: SharedTaskUpdate, session: SessionDep):
-    task_old = session.get(SharedTask, task_id)
-    if not task_old:
+async def update_task(workspace_id: int, task_id: int, task: SharedTaskUpdate, session: SessionDep, current_user: WorkspaceMember):
+    task_old = await session.get(SharedTask, task_id)
+    if not task_old or task_old.workspace_id != workspace_id:
         raise HTTPException(status_code=404, detail="Task not found")
     task_dict = task.model_dump(exclude_unset=True)
     task_old.sqlmodel_update(task_dict)
-    session.add(task_old)
-    session.commit()
-    session.refresh(task_old)
+    versions = await stamp_versions(session, shared_key(task_old.workspace_id), rows=[task_old])
+    await session.commit()
+    await session.refresh(task_old)
+    publish_changes(task_old.workspace_id, versions, upserts=[task_old.model_dump()])
     return task_old
+
+@router.post("/{workspace_id}/batch", response_model=BatchResponse)
+async def batch_tasks(workspace_id: int, batch: BatchRequest, current_user: WorkspaceMember, session: SessionDep):
+    return await apply_batch(session, batch.operations, SharedTask, SharedTaskbase, SharedTaskUpdate,
+                       in_scope=lambda task: task.workspace_id == workspace_id,
+                       defaults={"workspace_id": workspace_id, "created_by": current_user.name},
+                       version_key=shared_key(workspace_id),
+                       on_commit=lambda versions, upserts, deletes: publish_changes(workspace_id, versions, upserts, deletes))
+
+@router.get("/{workspace_id}/export")
+async def export_tasks(workspace_id: int, token: Annotated[str, Depends(oauth2_scheme)], format: Format = "jsonl"):
+    async with AsyncSession(database.engine) as session:
+        current_user = await get_current_user(session, token)
+        await check_member(session, workspace_id, current_user.name)
+    return StreamingResponse(export_rows(SharedTask, SharedTask.workspace_id == workspace_id, EXPORT_FIELDS, format),
+                             media_type=MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f'attachment; filename="workspace-{workspace_id}.{format}"'})
+
+@router.post("/{workspace_id}/import", response_model=ImportResult)
+async def import_tasks(workspace_id: int, request: Request, token: Annotated[str, Depends(oauth2_scheme)],
+    format: Format = "jsonl",
+):
+    # authorize with a short-lived session so the upload does not pin a DB connection
+    async with AsyncSession(database.engine) as session:
+        current_user = await get_current_user(session, token)
+        await check_member(session, workspace_id, current_user.name)
+    try:
+        return await import_rows(request.stream(), format, SharedTask, SharedTaskbase,
+                                 defaults={"workspace_id": workspace_id, "created_by": current_user.name},
+                                 version_key=shared_key(workspace_id))
+    finally:
+        # chunks commit as they go, so even a failed import changed the list; too big for a changes event
+        summary_cache.invalidate(workspace_id)
+        broker.publish(shared_key(workspace_id), {"type": "resync"})
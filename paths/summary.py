@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends
+from typing import Annotated
+from sqlmodel import select
+from sqlalchemy import func
+from database import SessionDep
+from .user_manager import get_current_user, oauth2_scheme
+from .shared_tasks import SharedTask
+from .workspace_manager import workspace_ids_for
+from .access import summary_cache
+
+# Mounted under /workspaces; kept apart from workspace_manager, which
+# shared_tasks imports for its membership checks.
+router = APIRouter()
+
+def empty_summary(workspace_id: int) -> dict:
+    return {"workspace_id": workspace_id, "total": 0, "open": 0, "completed": 0, "high": 0,
+            "by_status": {}, "by_priority": {}}
+
+async def count_tasks(session, workspace_ids) -> dict:
+    """Per-workspace task counts from one grouped query; workspace_ids may be a subquery."""
+    stmt = (
+        select(SharedTask.workspace_id, SharedTask.status, SharedTask.priority, func.count())
+        .where(SharedTask.workspace_id.in_(workspace_ids))
+        .group_by(SharedTask.workspace_id, SharedTask.status, SharedTask.priority)
+    )
+    summaries = {}
+    for ws_id, task_status, priority, n in await session.exec(stmt):
+        summary = summaries.setdefault(ws_id, empty_summary(ws_id))
+        summary["total"] += n
+        summary["completed" if task_status == "completed" else "open"] += n
+        if priority == "High" and task_status != "completed":
+            summary["high"] += n
+        summary["by_status"][task_status] = summary["by_status"].get(task_status, 0) + n
+        summary["by_priority"][priority] = summary["by_priority"].get(priority, 0) + n
+    return summaries
+
+@router.get("/summary")
+async def get_workspace_summary(session: SessionDep, token: Annotated[str, Depends(oauth2_scheme)]):
+    """Task counts (open, completed, open high-priority, per status and priority) for every accessible workspace."""
+    current_user = await get_current_user(session, token)
+    ws_ids = sorted(await workspace_ids_for(session, current_user.name))
+    # only workspaces written since they were last counted hit the database
+    result = {ws_id: summary_cache.get(ws_id) for ws_id in ws_ids}
+    missing = [ws_id for ws_id, summary in result.items() if summary is None]
+    if missing:
+        counts = await count_tasks(session, missing)
+        for ws_id in missing:
+            result[ws_id] = counts.get(ws_id, empty_summary(ws_id))
+            summary_cache.set(ws_id, result[ws_id])
+    return result
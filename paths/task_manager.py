@@ -1,8 +1,16 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
-from typing import Annotated, List
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Annotated, List, Literal
 from sqlmodel import select, SQLModel, Field
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import Index, text
+import database
 from database import SessionDep
 from .user_manager import User, get_current_user, oauth2_scheme
+from .pagination import keyset_page, next_cursor, nulls_last
+from .batch import BatchRequest, BatchResponse, apply_batch
+from .transfer import MEDIA_TYPES, Format, ImportResult, export_rows, import_rows
+from .versions import collection_validators, is_not_modified, personal_key, read_changes, stamp_versions, utcnow, UTCDatetime
 
 router = APIRouter()
 
@@ -12,72 +20,164 @@ class Taskbase(SQLModel):
     date: str = Field(index=True)
     status: str = Field(default="new")
     user_id: int = Field(index=True)
+    due_at: UTCDatetime | None = None
 
 class Task(Taskbase, table=True):
+    __table_args__ = (
+        Index("ix_task_user_version", "user_id", "version"),
+        # matches TASK_KEYSET, so status-ordered pages are read straight off the index
+        Index("ix_task_user_order", "user_id", text("status DESC"), "priority", "id"),
+        Index("ix_task_user_updated", "user_id", "updated_at"),
+        Index("ix_task_user_due_order", "user_id", text("(due_at IS NULL)"), "due_at", "id"),
+    )
     id: int | None = Field(default=None, primary_key=True)
+    version: int = Field(default=0, index=True, sa_column_kwargs={"server_default": "0"})
+    created_at: UTCDatetime | None = Field(default_factory=utcnow)
+    updated_at: UTCDatetime | None = Field(default_factory=utcnow)
 
 class TaskPublic(Taskbase):
     id: int
+    version: int = 0
+    created_at: UTCDatetime | None = None
+    updated_at: UTCDatetime | None = None
+
+class TaskPage(SQLModel):
+    tasks: List[TaskPublic]
+    next_cursor: str | None = None
+
+class TaskChanges(SQLModel):
+    upserts: List[TaskPublic]
+    deletes: List[int]
+    version: int
+    more: bool
 
 class TaskUpdate(SQLModel):
     name: str | None = None
     priority: str | None = None
     date: str | None = None
     status: str | None = None
+    due_at: UTCDatetime | None = None
+
+# open tasks first ("new" > "completed"), then priority as text (High < Low < Normal), then insertion order
+TASK_KEYSET = [(Task.status, True), (Task.priority, False), (Task.id, False)]
+TASK_ORDERINGS = {
+    "status": TASK_KEYSET,
+    "created": [(Task.id, True)],  # ids are handed out in creation order
+    "updated": [(Task.updated_at, True), (Task.id, True)],
+    "due": [nulls_last(Task.due_at), (Task.due_at, False), (Task.id, False)],  # tasks without a due date come last
+}
+EXPORT_FIELDS = ["id", "name", "priority", "date", "status", "due_at", "created_at", "updated_at"]
     
-def verify_user(session,token: Annotated[str, Depends(oauth2_scheme)]):
-    current_user = get_current_user(session,token)
+async def verify_user(session,token: Annotated[str, Depends(oauth2_scheme)]):
+    current_user = await get_current_user(session,token)
     return current_user.id
 
 @router.post("/{user_id}", response_model=TaskPublic)
-def create_task(task: Taskbase, session: SessionDep, token: Annotated[str, Depends(oauth2_scheme)]):
-    user = verify_user(session,token)
+async def create_task(task: Taskbase, session: SessionDep, token: Annotated[str, Depends(oauth2_scheme)]):
+    user = await verify_user(session,token)
     if user != task.user_id:
         raise HTTPException(status_code=404, detail="Invalid User")
 
     db_task = Task.model_validate(task)
-    session.add(db_task)
-    session.commit()
-    session.refresh(db_task)
+    await stamp_versions(session, personal_key(task.user_id), rows=[db_task])
+    await session.commit()
+    await session.refresh(db_task)
     return db_task
 
-@router.get("/{user_id}", response_model=List[TaskPublic])
-def read_task(user_id:int,
+@router.get("/{user_id}", response_model=TaskPage)
+async def read_task(user_id:int, request: Request, response: Response,
     session: SessionDep,token: Annotated[str, Depends(oauth2_scheme)],
-    offset: int = 0,
-    limit: Annotated[int, Query(le=100)] = 100,
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 100,
+    order_by: Literal["status", "created", "updated", "due"] = "status",
+    status: str | None = None,
+    priority: str | None = None,
 ):
-    user = verify_user(session,token)
+    user = await verify_user(session,token)
     if user != user_id:
         raise HTTPException(status_code=403, detail="Invalid User")
-    tasks = list(session.exec(select(Task).where(Task.user_id == user_id).offset(offset).limit(limit)).all())
-    return tasks
+    validators = await collection_validators(session, personal_key(user_id), cursor, limit, order_by, status, priority)
+    if is_not_modified(request, validators):
+        return Response(status_code=304, headers=validators)
+    response.headers.update(validators)
+    stmt = select(Task).where(Task.user_id == user_id)
+    if status:
+        stmt = stmt.where(Task.status == status)
+    if priority:
+        stmt = stmt.where(Task.priority == priority)
+    keyset = TASK_ORDERINGS[order_by]
+    tasks = list((await session.exec(keyset_page(stmt, keyset, cursor, limit))).all())
+    return TaskPage(tasks=tasks, next_cursor=next_cursor(tasks, keyset, limit))
+
+@router.get("/{user_id}/changes", response_model=TaskChanges)
+async def read_changes_since(user_id: int, token: Annotated[str, Depends(oauth2_scheme)], session: SessionDep,
+    since: int | None = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 500,
+):
+    user = await verify_user(session,token)
+    if user != user_id:
+        raise HTTPException(status_code=403, detail="Invalid User")
+    upserts, deletes, version, more = await read_changes(session, Task, Task.user_id == user_id, personal_key(user_id), since, limit)
+    return TaskChanges(upserts=upserts, deletes=deletes, version=version, more=more)
 
 @router.delete("/{user_id}/{task_id}")
-def delete_task(task_id: int, user_id: int, token: Annotated[str, Depends(oauth2_scheme)], session: SessionDep):
-    user = verify_user(session,token)
+async def delete_task(task_id: int, user_id: int, token: Annotated[str, Depends(oauth2_scheme)], session: SessionDep):
+    user = await verify_user(session,token)
     if user != user_id:
         raise HTTPException(status_code=403, detail="Invalid User")
 
-    task = session.get(Task, task_id)
+    task = await session.get(Task, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
-    session.delete(task)
-    session.commit()
+    await session.delete(task)
+    await stamp_versions(session, personal_key(user_id), deleted_ids=[task_id])
+    await session.commit()
     return {"ok": True}
 
 @router.put("/{user_id}/{task_id}", response_model=TaskPublic)
-def update_task(task_id: int, user_id:int, task: TaskUpdate, token: Annotated[str, Depends(oauth2_scheme)], session: SessionDep):
-    user = verify_user(session,token)
+async def update_task(task_id: int, user_id:int, task: TaskUpdate, token: Annotated[str, Depends(oauth2_scheme)], session: SessionDep):
+    user = await verify_user(session,token)
     if user!= user_id:
         raise HTTPException(status_code=403, detail="Invalid User")
 
-    task_old = session.get(Task, task_id)
+    task_old = await session.get(Task, task_id)
     if not task_old:
         raise HTTPException(status_code=404, detail="Task not found")
     task_dict = task.model_dump(exclude_unset=True)
     task_old.sqlmodel_update(task_dict)
-    session.add(task_old)
-    session.commit()
-    session.refresh(task_old)
+    await stamp_versions(session, personal_key(user_id), rows=[task_old])
+    await session.commit()
+    await session.refresh(task_old)
     return task_old
+
+@router.post("/{user_id}/batch", response_model=BatchResponse)
+async def batch_tasks(user_id: int, batch: BatchRequest, token: Annotated[str, Depends(oauth2_scheme)], session: SessionDep):
+    user = await verify_user(session,token)
+    if user != user_id:
+        raise HTTPException(status_code=403, detail="Invalid User")
+    return await apply_batch(session, batch.operations, Task, Taskbase, TaskUpdate,
+                       in_scope=lambda task: task.user_id == user_id,
+                       defaults={"user_id": user_id},
+                       version_key=personal_key(user_id))
+
+@router.get("/{user_id}/export")
+async def export_tasks(user_id: int, token: Annotated[str, Depends(oauth2_scheme)], format: Format = "jsonl"):
+    # authorize with a short-lived session so the download does not pin a DB connection
+    async with AsyncSession(database.engine) as session:
+        user = await verify_user(session,token)
+    if user != user_id:
+        raise HTTPException(status_code=403, detail="Invalid User")
+    return StreamingResponse(export_rows(Task, Task.user_id == user_id, EXPORT_FIELDS, format), media_type=MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f'attachment; filename="tasks.{format}"'})
+
+@router.post("/{user_id}/import", response_model=ImportResult)
+async def import_tasks(user_id: int, request: Request, token: Annotated[str, Depends(oauth2_scheme)],
+    format: Format = "jsonl",
+):
+    # authorize with a short-lived session so the upload does not pin a DB connection
+    async with AsyncSession(database.engine) as session:
+        user = await verify_user(session,token)
+    if user != user_id:
+        raise HTTPException(status_code=403, detail="Invalid User")
+    return await import_rows(request.stream(), format, Task, Taskbase,
+                             defaults={"user_id": user_id}, version_key=personal_key(user_id))
@@ -0,0 +1,157 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import List, Literal
+from pydantic import ValidationError
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import insert
+import database
+from .batch import validation_message
+from .versions import bump_version, utcnow
+
+# Exports read through a server-side cursor and go out a chunk at a time;
+# imports parse the body as it arrives and insert IMPORT_CHUNK rows per
+# transaction. Neither side ever holds a whole task list, and no import
+# transaction is open while the client is still uploading.
+
+EXPORT_CHUNK = 1000
+IMPORT_CHUNK = 500
+MAX_REPORTED_ERRORS = 20
+
+Format = Literal["jsonl", "csv"]
+MEDIA_TYPES = {"jsonl": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+class ImportResult(SQLModel):
+    imported: int = 0
+    rejected: int = 0
+    errors: List[str] = []  # the first MAX_REPORTED_ERRORS, as "line N: reason"
+    version: int | None = None
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+async def export_rows(table, scope, fields: List[str], fmt: Format):
+    """Rows of table matching scope in id order, as JSONL or CSV text chunks.
+
+    Runs in its own session because the response is streamed after the
+    request's session is gone.
+    """
+    columns = [getattr(table, field) for field in fields]
+    stmt = select(*columns).where(scope).order_by(table.id).execution_options(yield_per=EXPORT_CHUNK)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(fields)
+        yield buffer.getvalue()
+    async with AsyncSession(database.engine) as session:
+        result = await session.stream(stmt)
+        async for rows in result.partitions():
+            records = ([_plain(value) for value in row] for row in rows)
+            if fmt == "jsonl":
+                yield "".join(json.dumps(dict(zip(fields, record))) + "\n" for record in records)
+            else:
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(records)
+                yield buffer.getvalue()
+
+def _decode(line: bytes, first: bool) -> str:
+    # utf-8-sig drops the BOM spreadsheet programs put in front of CSV files
+    return line.decode("utf-8-sig" if first else "utf-8", errors="replace").rstrip("\r")
+
+async def _lines(chunks):
+    """(line number, text) for each line of a streamed body."""
+    pending, number = b"", 0
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            number += 1
+            yield number, _decode(line, number == 1)
+    if pending:
+        yield number + 1, _decode(pending, number == 0)
+
+async def _records(chunks, fmt: Format):
+    """(line number, record, error) per JSONL line or CSV row; one of record/error is None."""
+    header, record, start = None, [], None
+    async for number, line in _lines(chunks):
+        if fmt == "jsonl":
+            if not line.strip():
+                continue
+            try:
+                value = json.loads(line)
+            except ValueError:
+                yield number, None, "not valid JSON"
+                continue
+            if isinstance(value, dict):
+                yield number, value, None
+            else:
+                yield number, None, "expected a JSON object"
+            continue
+        # a quoted CSV field may contain newlines: keep reading until the quotes balance
+        record.append(line)
+        start = start or number
+        if sum(part.count('"') for part in record) % 2:
+            continue
+        text, first = "\n".join(record), start
+        record, start = [], None
+        if not text.strip():
+            continue
+        try:
+            row = next(csv.reader([text]))
+        except csv.Error as e:
+            yield first, None, str(e)
+            continue
+        if header is None:
+            header = [name.strip() for name in row]
+        elif len(row) != len(header):
+            yield first, None, f"expected {len(header)} fields, got {len(row)}"
+        else:
+            # empty cells fall back to the model's defaults
+            yield first, {name: value for name, value in zip(header, row) if value != ""}, None
+    if record:
+        yield start, None, "unterminated quoted field"
+
+async def _insert_chunk(table, version_key: str, records: List[dict]) -> int:
+    # a session of its own, opened once the chunk is parsed: the version row is
+    # locked only for the insert, never while waiting on the upload
+    async with AsyncSession(database.engine) as session:
+        top = await bump_version(session, version_key, len(records))
+        now = utcnow()
+        for version, record in enumerate(records, top - len(records) + 1):
+            record.update(version=version, created_at=now, updated_at=now)
+        await session.exec(insert(table), params=records)
+        await session.commit()
+    return top
+
+async def import_rows(chunks, fmt: Format, table, base, defaults: dict, version_key: str) -> ImportResult:
+    """Validate each record against base (defaults win) and bulk insert the valid ones.
+
+    Each chunk is committed in its own transaction, so a failed import keeps
+    the chunks before it; invalid records are counted and skipped.
+    """
+    result = ImportResult()
+    pending = []
+
+    async def flush():
+        result.version = await _insert_chunk(table, version_key, pending)
+        result.imported += len(pending)
+        pending.clear()
+
+    async for number, record, error in _records(chunks, fmt):
+        if record is not None:
+            try:
+                pending.append(base.model_validate({**record, **defaults}).model_dump())
+            except ValidationError as e:
+                error = validation_message(e)
+        if error is not None:
+            result.rejected += 1
+            if len(result.errors) < MAX_REPORTED_ERRORS:
+                result.errors.append(f"line {number}: {error}")
+        if len(pending) >= IMPORT_CHUNK:
+            await flush()
+    if pending:
+        await flush()
+    return result
@@ -1,15 +1,19 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from sqlmodel import select, SQLModel, Field
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import Annotated
+import database
 from database import SessionDep
-from passlib.context import CryptContext
+from hashing import HashingBusy, hash_password, verify_password
 from fastapi.security import OAuth2PasswordBearer
 import jwt
 from jwt.exceptions import InvalidTokenError, ExpiredSignatureError
 from datetime import datetime, timedelta, timezone
+from cache import TTLCache
+from metrics import timed
+import os
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 
 class UserBase(SQLModel):
     name: str = Field(index = True, unique=True)
@@ -26,20 +30,36 @@ SECRET_KEY = "dbb5fa7441754642df2fb15632614e64df3a67e734d14ea9feedbcc79946d969"
 ALGORITHM = "HS256"
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# username -> detached User row, skips the per-request lookup in get_current_user
+user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "300")),
+)
+
+def invalidate_user(name: str):
+    user_cache.invalidate(name)
+
+async def hashing(coro):
+    try:
+        return await coro
+    except HashingBusy:
+        raise HTTPException(status_code=503, detail="Too many logins, try again shortly", headers={"Retry-After": "1"})
+
 # to_encode = {"user_name": "test", "exp": "days"}
 def create_access_token(data: dict):
     to_encode = data.copy()
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt  
         
-def get_current_user(session: SessionDep, token: Annotated[str, Depends(oauth2_scheme)]):
+async def get_current_user(session: SessionDep, token: Annotated[str, Depends(oauth2_scheme)]):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with timed("jwt"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username = payload.get("user_name")
         if username is None:
             raise credentials_exception
@@ -47,28 +67,48 @@ def get_current_user(session: SessionDep, token: Annotated[str, Depends(oauth2_s
         raise HTTPException(status_code=401, detail="Token expired")
     except InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
-    user =  session.exec(select(User).where(User.name == username)).first()
+    user = user_cache.get(username)
+    if user is not None:
+        return user
+    with timed("user_lookup"):
+        user = (await session.exec(select(User).where(User.name == username))).first()
     if user is None:
         raise credentials_exception
+    user_cache.set(username, User(id=user.id, name=user.name, password=user.password))
     return user
 
+async def authenticate(token: str):
+    """get_current_user on its own short-lived session, for long-running handlers."""
+    async with AsyncSession(database.engine) as session:
+        return await get_current_user(session, token)
+
 @router.post("/register/", response_model=UserPublic)
-def create_user(user: UserBase, session: SessionDep):
+async def create_user(user: UserBase, session: SessionDep):
     if len(user.password)<5:
         raise HTTPException(status_code=400, detail="Password too short")
 
-    user.password=pwd_context.hash(user.password)
+    user.password = await hashing(hash_password(user.password))
     db_user = User.model_validate(user)
     session.add(db_user)
-    session.commit()
-    session.refresh(db_user)
+    await session.commit()
+    await session.refresh(db_user)
+    invalidate_user(db_user.name)
     return db_user
 
 @router.post("/login/")
-def read_user(user: UserBase, session: SessionDep):
-    user_exist = session.exec(select(User).where(User.name == user.name)).first()
-    if not user_exist or not pwd_context.verify(user.password, user_exist.password):
+async def read_user(user: UserBase, session: SessionDep):
+    user_exist = (await session.exec(select(User).where(User.name == user.name))).first()
+    if not user_exist:
+        raise HTTPException(status_code=401, detail="Incorrect username or password")
+    ok, new_hash = await hashing(verify_password(user.password, user_exist.password))
+    if not ok:
         raise HTTPException(status_code=401, detail="Incorrect username or password")
+    if new_hash:
+        # stored with older argon2 parameters; upgrade while we have the plaintext
+        user_exist.password = new_hash
+        session.add(user_exist)
+        await session.commit()
+        invalidate_user(user_exist.name)
     
     # create token    
     expiry = datetime.now(timezone.utc) + timedelta(days=60)
@@ -77,6 +117,6 @@ def read_user(user: UserBase, session: SessionDep):
     return {"access_token": token, "token_type": "bearer"}
         
 @router.get("/verify",response_model=UserPublic)
-def verify_user(session: SessionDep, token: Annotated[str, Depends(oauth2_scheme)]):
-    user = get_current_user(session, token)
+async def verify_user(session: SessionDep, token: Annotated[str, Depends(oauth2_scheme)]):
+    user = await get_current_user(session, token)
     return user
\ No newline at end of file
@@ -0,0 +1,134 @@
+from datetime import datetime, timezone
+from typing import Annotated
+from pydantic import AfterValidator
+import hashlib
+from fastapi import Request
+from sqlmodel import SQLModel, Field, select
+from sqlalchemy import Index, update
+from sqlalchemy.exc import IntegrityError
+
+# Every listed collection (a user's personal tasks, a workspace's shared tasks,
+# a user's workspace list) carries a version that is bumped inside the same
+# transaction as any write to it. Listings derive their ETag from it,
+# and each written task row is stamped with a version of its own so clients
+# can ask for the changes since the last version they saw.
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+# timestamp columns store aware datetimes; clients may send naive ones, read as UTC
+UTCDatetime = Annotated[datetime, AfterValidator(lambda value: value if value.tzinfo else value.replace(tzinfo=timezone.utc))]
+
+class CollectionVersion(SQLModel, table=True):
+    key: str = Field(primary_key=True)
+    version: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=utcnow)
+
+class Tombstone(SQLModel, table=True):
+    __table_args__ = (Index("ix_tombstone_collection_version", "collection", "version"), )
+    id: int | None = Field(default=None, primary_key=True)
+    collection: str
+    task_id: int
+    version: int
+
+def personal_key(user_id: int) -> str:
+    return f"personal:{user_id}"
+
+def shared_key(workspace_id: int) -> str:
+    return f"shared:{workspace_id}"
+
+def workspaces_key(username: str) -> str:
+    return f"workspaces:{username}"
+
+async def bump_version(session, key: str, n: int = 1) -> int:
+    """Reserve n versions and return the highest; the row stays locked until commit.
+
+    Writers to one collection are serialised by that lock, so versions are
+    committed in increasing order.
+    """
+    now = utcnow()
+    stmt = (
+        update(CollectionVersion)
+        .where(CollectionVersion.key == key)
+        .values(version=CollectionVersion.version + n, updated_at=now)
+        .returning(CollectionVersion.version)
+    )
+    with session.no_autoflush:
+        row = (await session.exec(stmt)).first()
+    if row is not None:
+        return row[0]
+    try:
+        async with session.begin_nested():
+            session.add(CollectionVersion(key=key, version=n, updated_at=now))
+        return n
+    except IntegrityError:
+        # a concurrent writer created the row first
+        return (await session.exec(stmt)).first()[0]
+
+async def stamp_versions(session, key: str, rows=(), deleted_ids=()):
+    """Give every written row and deleted id its own version (and updated_at), with tombstones for deletes.
+
+    Returns (since, version): the collection moves from `since` to `version`.
+    """
+    n = len(rows) + len(deleted_ids)
+    if not n:
+        return None
+    top = await bump_version(session, key, n)
+    version = top - n
+    now = utcnow()
+    for row in rows:
+        version += 1
+        row.version = version
+        row.updated_at = now
+        session.add(row)
+    for task_id in deleted_ids:
+        version += 1
+        session.add(Tombstone(collection=key, task_id=task_id, version=version))
+    return top - n, top
+
+async def current_version(session, key: str) -> int:
+    row = await session.get(CollectionVersion, key)
+    return row.version if row else 0
+
+async def read_changes(session, table, scope, key: str, since: int | None, limit: int):
+    """Rows written and ids deleted after `since`, oldest first.
+
+    Returns (upserts, deletes, version, more); pass `version` back as the next
+    `since`. since=None is a full snapshot (tombstones are skipped).
+    """
+    latest = await current_version(session, key)  # read first: later commits get higher versions
+    stmt = select(table).where(scope)
+    if since is not None:
+        stmt = stmt.where(table.version > since)
+    items = [(row.version, row) for row in await session.exec(stmt.order_by(table.version).limit(limit + 1))]
+    if since is not None:
+        tombs = select(Tombstone).where(Tombstone.collection == key, Tombstone.version > since)
+        items += [(t.version, t) for t in await session.exec(tombs.order_by(Tombstone.version).limit(limit + 1))]
+        items.sort(key=lambda item: item[0])
+    more = len(items) > limit
+    del items[limit:]
+    if more:
+        version = items[-1][0]
+    else:
+        version = max(latest, items[-1][0] if items else since or 0)
+    upserts = [item for _, item in items if not isinstance(item, Tombstone)]
+    deletes = [item.task_id for _, item in items if isinstance(item, Tombstone)]
+    return upserts, deletes, version, more
+
+async def collection_validators(session, key: str, *vary) -> dict:
+    """ETag header for a listing; vary holds the query params shaping the page.
+
+    No Last-Modified: its one-second resolution would let two writes in the
+    same second share a validator, and the version never does.
+    """
+    row = await session.get(CollectionVersion, key)
+    version = row.version if row else 0
+    digest = hashlib.sha1(f"{key}:{version}:{vary}".encode()).hexdigest()[:20]
+    return {"ETag": f'"{digest}"', "Cache-Control": "private, no-cache"}
+
+def is_not_modified(request: Request, validators: dict) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or validators["ETag"] in tags
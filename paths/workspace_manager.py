@@ -1,10 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from typing import Annotated
 from sqlmodel import select, SQLModel, Field
 from database import SessionDep
 from .user_manager import User, get_current_user, oauth2_scheme
 from sqlalchemy import UniqueConstraint, delete
 from sqlalchemy import or_
+from .versions import bump_version, collection_validators, is_not_modified, shared_key, workspaces_key
+from .events import broker
+from .access import invalidate_memberships, membership_cache, summary_cache
 
 router = APIRouter()
 
@@ -17,33 +20,76 @@ class Workspace(WorkspaceBase,table=True):
     id: int = Field(default=None,primary_key=True)
 
 class MembersBase(SQLModel):    
-    workspace_id: int = Field(index=True)
+    workspace_id: int = Field(index=True, foreign_key="workspace.id", ondelete="CASCADE")
     member: str
 
 class Members(MembersBase, table=True):    
     __table_args__ = (UniqueConstraint("workspace_id", "member"), )
     id : int = Field(default=None, primary_key=True)
 
+async def bump_workspace_users(session, workspace_id: int, owner: str, *extra: str):
+    # a workspace change alters the listing of its owner and of every member
+    members = (await session.exec(select(Members.member).where(Members.workspace_id == workspace_id))).all()
+    users = {owner, *members, *extra}
+    for name in users:
+        await bump_version(session, workspaces_key(name))
+    return users
+
+def workspace_references():
+    """(table, column) for every column holding a workspace id through a foreign key."""
+    return [(table, fk.parent) for table in SQLModel.metadata.sorted_tables
+            for fk in table.foreign_keys if fk.column is Workspace.__table__.c.id]
+
+def accessible_workspace_ids(username: str):
+    """Subquery of the ids of workspaces the user owns or is a member of."""
+    return (
+        select(Workspace.id)
+        .join(Members, Workspace.id == Members.workspace_id, isouter=True)
+        .where(or_(Workspace.owner == username, Members.member == username))
+    )
+
+async def workspace_ids_for(session, username: str) -> frozenset:
+    """Ids of the workspaces the user owns or belongs to, cached per user."""
+    ids = membership_cache.get(username)
+    if ids is None:
+        ids = frozenset((await session.exec(accessible_workspace_ids(username))).all())
+        membership_cache.set(username, ids)
+    return ids
+
+async def check_member(session, workspace_id: int, username: str):
+    if workspace_id not in await workspace_ids_for(session, username):
+        raise HTTPException(status_code=403, detail="Not a member of this workspace")
+
+async def workspace_member(workspace_id: int, session: SessionDep, token: Annotated[str, Depends(oauth2_scheme)]) -> User:
+    """Dependency for /{workspace_id} routes: the current user, if they own or belong to the workspace."""
+    current_user = await get_current_user(session, token)
+    await check_member(session, workspace_id, current_user.name)
+    return current_user
+
+WorkspaceMember = Annotated[User, Depends(workspace_member)]
+
 @router.post("/")
-def create_workspace(workspace: WorkspaceBase, session: SessionDep):
-    user =  session.exec(select(User).where(User.name == workspace.owner)).first()
+async def create_workspace(workspace: WorkspaceBase, session: SessionDep):
+    user = (await session.exec(select(User).where(User.name == workspace.owner))).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     workspace_db = Workspace.model_validate(workspace)
     session.add(workspace_db)
-    session.commit()
-    session.refresh(workspace_db)
+    await bump_version(session, workspaces_key(workspace.owner))
+    await session.commit()
+    await session.refresh(workspace_db)
+    invalidate_memberships(workspace.owner)
     return workspace_db.id
 
 @router.post("/{workspace_id}/members")
-def create_member(mem: MembersBase, session: SessionDep, token: Annotated[str, Depends(oauth2_scheme)]):
-    user =  session.exec(select(User).where(User.name == mem.member)).first()
+async def create_member(mem: MembersBase, session: SessionDep, token: Annotated[str, Depends(oauth2_scheme)]):
+    user = (await session.exec(select(User).where(User.name == mem.member))).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    current_user = get_current_user(session,token)
-    owner = session.get(Workspace,mem.workspace_id)
+    current_user = await get_current_user(session,token)
+    owner = await session.get(Workspace,mem.workspace_id)
     
     if owner is None:
         raise HTTPException(status_code=403, detail="Invalid  owner.")
@@ -51,79 +97,89 @@ def create_member(mem: MembersBase, session: SessionDep, token: Annotated[str, D
     if owner.owner == current_user.name:
         member_class = Members.model_validate(mem)
         session.add(member_class)
-        session.commit()
-        session.refresh(member_class)
+        await bump_workspace_users(session, owner.id, owner.owner, mem.member)
+        await session.commit()
+        await session.refresh(member_class)
+        invalidate_memberships(mem.member)
         return member_class
     else:
         raise HTTPException(status_code=403, detail="Invalid Owner")
     
 
 @router.get("/")
-def get_workspace(session: SessionDep, token: Annotated[str, Depends(oauth2_scheme)]):
-    current_user = get_current_user(session,token)
-    workspaces = []
+async def get_workspace(request: Request, response: Response, session: SessionDep, token: Annotated[str, Depends(oauth2_scheme)]):
+    current_user = await get_current_user(session,token)
+    validators = await collection_validators(session, workspaces_key(current_user.name))
+    if is_not_modified(request, validators):
+        return Response(status_code=304, headers=validators)
+    response.headers.update(validators)
+    accessible_ws_ids = accessible_workspace_ids(current_user.name)
+    # one round-trip: every accessible workspace joined with all of its members
     stmt = (
-        select(Workspace.id)
+        select(Workspace.id, Workspace.name, Workspace.owner, Members.member)
         .join(Members, Workspace.id == Members.workspace_id, isouter=True)
-        .filter(or_(Workspace.owner == current_user.name, Members.member == current_user.name))
+        .where(Workspace.id.in_(accessible_ws_ids))
+        .order_by(Workspace.id, Members.id)
     )
-    accessible_ws_ids = list(session.exec(stmt))
-    for k in accessible_ws_ids:
-       stmt = (
-           select(Workspace,Members)
-           .join(Members, Workspace.id == Members.workspace_id, isouter=True)
-           .where(Workspace.id == k))
-       workspaces += list(session.exec(stmt).all())
-    if workspaces is None:
-        raise HTTPException(status_code=404, detail="No Workspace")
+    workspaces = (await session.exec(stmt)).all()
 
     result = {}
      
-    for workspace, member in workspaces:
-        if workspace.id not in result:
-            result[workspace.id] = {
-                "workspace_id": workspace.id,
-                "name": workspace.name,
-                "owner": workspace.owner,
+    for ws_id, name, owner, member in workspaces:
+        if ws_id not in result:
+            result[ws_id] = {
+                "workspace_id": ws_id,
+                "name": name,
+                "owner": owner,
                 "members": []
             }
             
         if member is not None:
-             result[workspace.id]["members"].append(member.member)
+             result[ws_id]["members"].append(member)
         else:
-            if not result[workspace.id]["members"]:
-                 result[workspace.id]["members"].append(" ")
+            if not result[ws_id]["members"]:
+                 result[ws_id]["members"].append(" ")
 
     return result
 
 @router.delete("/{workspace_id}")
-def delete_workspace(workspace_id: int, token: Annotated[str, Depends(oauth2_scheme)], session: SessionDep):
-    current_user = get_current_user(session,token)
-    workspace = session.get(Workspace, workspace_id)
+async def delete_workspace(workspace_id: int, token: Annotated[str, Depends(oauth2_scheme)], session: SessionDep):
+    current_user = await get_current_user(session,token)
+    workspace = await session.get(Workspace, workspace_id)
     if not workspace:
         return None
     if workspace.owner == current_user.name:
-        session.delete(workspace)
-        stmt = delete(Members).where(Members.workspace_id == workspace_id)
-        session.exec(stmt)
-        session.commit()
+        users = await bump_workspace_users(session, workspace_id, workspace.owner)
+        await bump_version(session, shared_key(workspace_id))
+        # members and shared tasks go in the same transaction, one statement per
+        # table; explicit because SQLite databases created before the foreign
+        # keys existed have no ON DELETE CASCADE
+        for table, column in workspace_references():
+            await session.exec(delete(table).where(column == workspace_id))
+        await session.exec(delete(Workspace).where(Workspace.id == workspace_id))
+        await session.commit()
+        summary_cache.invalidate(workspace_id)
+        invalidate_memberships(*users)
+        broker.publish(shared_key(workspace_id), {"type": "workspace_deleted", "workspace_id": workspace_id})
         return {200 : "Deleted successfully."}
     else:
         raise HTTPException(status_code=403, detail="Invalid Owner")
     
 @router.delete("/{workspace_id}/members/{membername}")
-def delete_mem(workspace_id:int ,membername:str ,token: Annotated[str, Depends(oauth2_scheme)], session: SessionDep):
-    current_user = get_current_user(session,token)
-    member = session.exec(select(Members).where(Members.workspace_id==workspace_id).where(Members.member==membername))
+async def delete_mem(workspace_id:int ,membername:str ,token: Annotated[str, Depends(oauth2_scheme)], session: SessionDep):
+    current_user = await get_current_user(session,token)
+    member = await session.exec(select(Members).where(Members.workspace_id==workspace_id).where(Members.member==membername))
     if not member:
         raise HTTPException(status_code=404, detail="Member not found")
-    owner = session.get(Workspace,workspace_id)
+    owner = await session.get(Workspace,workspace_id)
     if owner is None:
         raise HTTPException(status_code=403, detail="Invalid  owner.")
     if owner.owner == current_user.name:    
+        await bump_workspace_users(session, workspace_id, owner.owner)
         stmt = delete(Members).where(Members.workspace_id == workspace_id).where(Members.member == membername)
-        session.exec(stmt)
-        session.commit()
+        await session.exec(stmt)
+        await session.commit()
+        invalidate_memberships(membername)
         return {200 : "Deleted successfully."}
     else:
         raise HTTPException(status_code=403, detail="Invalid Owner")
@@ -0,0 +1,47 @@
+import curses
+
+class Frame:
+    """Repaints only the rows of a window that changed since the last draw.
+
+    A screen describes itself as {y: (x, text, attr)}; rows that match what is
+    already shown are skipped and the rest go out with one noutrefresh/doupdate,
+    so moving the cursor rewrites two lines instead of the whole terminal.
+    """
+
+    def __init__(self, win):
+        self.win = win
+        self.shown = {}
+        self.size = None
+
+    def invalidate(self):
+        """Forget what is on screen, after a prompt or another screen drew over the window."""
+        self.size = None
+
+    def draw(self, rows, cursor=None):
+        size = self.win.getmaxyx()
+        if size != self.size:
+            self.win.erase()  # not clear(): that would make curses resend every cell
+            self.shown = {}
+            self.size = size
+        height, width = size
+        rows = {y: row for y, row in rows.items() if 0 <= y < height}
+        for y in self.shown.keys() - rows.keys():
+            self.win.move(y, 0)
+            self.win.clrtoeol()
+        for y, row in rows.items():
+            if self.shown.get(y) == row:
+                continue
+            x, text, attr = row
+            self.win.move(y, 0)
+            self.win.clrtoeol()
+            if x < width - 1:
+                # stop short of the last column; writing there fails on the bottom line
+                self.win.addnstr(y, x, text, width - 1 - x, attr)
+        self.shown = rows
+        if cursor is not None:
+            self.win.move(*cursor)
+        self.win.noutrefresh()
+        curses.doupdate()
+
+def centered(width, text, attr=curses.A_NORMAL):
+    return (max(0, (width - len(text)) // 2), text, attr)